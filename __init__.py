@@ -14,6 +14,11 @@ import bpy
 
 from . import addon_preferences
 from . import properties
+from . import cache
+from . import writer
+from . import autosave
+from . import retention
+from . import scrub
 from . import operators
 from . import panels
 
@@ -21,6 +26,11 @@ from . import panels
 modules = [
     addon_preferences,
     properties,
+    cache,
+    writer,
+    autosave,
+    retention,
+    scrub,
     operators,
     panels,
 ]
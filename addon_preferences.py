@@ -1,9 +1,19 @@
 import bpy
 from bpy.types import AddonPreferences
-from bpy.props import StringProperty, BoolProperty
+from bpy.props import StringProperty, BoolProperty, IntProperty, FloatProperty, EnumProperty
 import os
 import tempfile
 
+def _restart_writer(self, context):
+    from . import writer
+    writer.shutdown()
+
+
+def _update_cache_budget(self, context):
+    from . import cache
+    cache.update_budget(self)
+
+
 class MeshHistoryPreferences(AddonPreferences):
     bl_idname = __package__
 
@@ -14,6 +24,268 @@ class MeshHistoryPreferences(AddonPreferences):
         subtype='DIR_PATH'
     )
 
+    background_writes: BoolProperty(
+        name="Write in Background",
+        description="Encode and write snapshot files on worker threads so saving does not block the UI",
+        default=True
+    )
+
+    writer_threads: IntProperty(
+        name="Writer Threads",
+        description="Number of worker threads writing snapshot files",
+        default=2,
+        min=1,
+        max=32,
+        update=_restart_writer
+    )
+
+    max_pending_writes: IntProperty(
+        name="Max Pending Writes",
+        description="Saving waits once this many snapshots are queued for writing",
+        default=8,
+        min=1,
+        max=256,
+        update=_restart_writer
+    )
+
+    unchanged_save_action: EnumProperty(
+        name="Unchanged Mesh",
+        description="What to do when saving a mesh identical to its latest snapshot",
+        items=[
+            ('SKIP', "Skip", "Do not save a new snapshot"),
+            ('TOUCH', "Update Timestamp", "Do not save, but move the latest snapshot's timestamp to now"),
+            ('SAVE', "Save Anyway", "Always save a new snapshot"),
+        ],
+        default='SKIP'
+    )
+
+    capture_attributes: BoolProperty(
+        name="Capture Attributes",
+        description="Also store UV maps, material indices, edge and face flags, custom attributes "
+                    "and vertex group weights, so restores bring them back",
+        default=True
+    )
+
+    use_chunk_store: BoolProperty(
+        name="Deduplicate Arrays",
+        description="Store large arrays once by content hash and share them between snapshots",
+        default=True
+    )
+
+    use_pack_store: BoolProperty(
+        name="Pack Snapshots",
+        description="Append snapshots to a few pack files instead of writing one file per snapshot",
+        default=False
+    )
+
+    pack_scope: EnumProperty(
+        name="One Pack per",
+        description="How snapshots are grouped into pack files",
+        items=[
+            ('PROJECT', "Project", "One pack per .blend file"),
+            ('OBJECT', "Object", "One pack per object"),
+        ],
+        default='PROJECT'
+    )
+
+    compression_codec: EnumProperty(
+        name="Compression",
+        description="Codec used to compress snapshot arrays",
+        items=[
+            ('NONE', "None", "Store arrays uncompressed"),
+            ('ZLIB', "zlib", "Fast, moderate compression"),
+            ('BZ2', "bz2", "Slower, better compression"),
+            ('LZMA', "LZMA", "Slowest, best compression"),
+        ],
+        default='NONE'
+    )
+
+    compression_level: IntProperty(
+        name="Compression Level",
+        description="Higher levels give smaller files but take longer to write",
+        default=6,
+        min=1,
+        max=9
+    )
+
+    position_quantization: EnumProperty(
+        name="Quantize Positions",
+        description="Store vertex positions as integers on a grid spanning the mesh bounds. "
+                    "Much smaller, but restores are only accurate to the grid",
+        items=[
+            ('NONE', "Off", "Store exact positions"),
+            ('16', "16-bit", "65536 steps per axis"),
+            ('21', "21-bit", "About 2 million steps per axis"),
+        ],
+        default='NONE'
+    )
+
+    quantize_autosaves_only: BoolProperty(
+        name="Auto Snapshots Only",
+        description="Quantize only the snapshots taken by the autosave timer",
+        default=True
+    )
+
+    quantization_max_error: FloatProperty(
+        name="Max Error",
+        description="Store exact positions when quantizing would move a vertex further than this (0 for no limit)",
+        default=0.001,
+        min=0.0,
+        soft_max=1.0,
+        precision=5,
+        subtype='DISTANCE'
+    )
+
+    use_delta_snapshots: BoolProperty(
+        name="Delta Snapshots",
+        description="Store only the changed vertex positions when the topology matches the previous snapshot",
+        default=True
+    )
+
+    keyframe_interval: IntProperty(
+        name="Keyframe Interval",
+        description="Store a full snapshot every N snapshots to keep restore chains short",
+        default=10,
+        min=1,
+        max=1000
+    )
+
+    cache_budget_mb: IntProperty(
+        name="Cache Budget (MB)",
+        description="Memory kept for decoded snapshots so switching between them does not reload files",
+        default=512,
+        min=0,
+        max=65536,
+        update=_update_cache_budget
+    )
+
+    cache_new_snapshots: BoolProperty(
+        name="Cache New Snapshots",
+        description="Keep freshly saved snapshots in the cache so the first restore is instant",
+        default=True
+    )
+
+    stream_threshold_mb: IntProperty(
+        name="Streaming Threshold (MB)",
+        description="Meshes at least this large are saved and restored in chunks without intermediate copies. "
+                    "Such saves skip deltas, background writes and attribute layers (0 to never stream)",
+        default=512,
+        min=0,
+        max=1048576
+    )
+
+    stream_chunk_mb: IntProperty(
+        name="Chunk Size (MB)",
+        description="Bytes encoded or decoded at a time while streaming a large mesh",
+        default=16,
+        min=1,
+        max=1024
+    )
+
+    direct_mesh_access: BoolProperty(
+        name="Direct Mesh Access",
+        description="Read and write the mesh arrays of large meshes in place instead of copying them. "
+                    "Falls back to copying when the mesh layout is not recognized",
+        default=True
+    )
+
+    scrub_interpolate: BoolProperty(
+        name="Blend While Scrubbing",
+        description="Blend between adjacent snapshots while scrubbing instead of jumping from one to the next",
+        default=True
+    )
+
+    scrub_prefetch: IntProperty(
+        name="Prefetch Snapshots",
+        description="Snapshots on either side of the scrub position decoded ahead of time in the background",
+        default=2,
+        min=0,
+        max=16
+    )
+
+    list_rows: IntProperty(
+        name="List Rows",
+        description="Number of snapshots shown at once in the sidebar list",
+        default=8,
+        min=3,
+        max=50
+    )
+
+    autosave_enabled: BoolProperty(
+        name="Auto Snapshots",
+        description="Periodically snapshot meshes that changed since their last snapshot",
+        default=False
+    )
+
+    autosave_interval: FloatProperty(
+        name="Interval (s)",
+        description="Seconds between automatic snapshot passes",
+        default=300.0,
+        min=10.0,
+        max=86400.0
+    )
+
+    autosave_max_mb_per_minute: FloatProperty(
+        name="Max MB per Minute",
+        description="Upper bound on mesh data autosave may write per minute",
+        default=256.0,
+        min=1.0,
+        max=100000.0
+    )
+
+    autosave_max_concurrent_writes: IntProperty(
+        name="Max Concurrent Writes",
+        description="Autosave waits while this many of its snapshots are still being written",
+        default=2,
+        min=1,
+        max=32
+    )
+
+    retention_enabled: BoolProperty(
+        name="Automatic Clean Up",
+        description="Periodically apply the retention limits and remove orphaned files from the save directory",
+        default=False
+    )
+
+    retention_interval: FloatProperty(
+        name="Interval (min)",
+        description="Minutes between automatic clean up passes",
+        default=10.0,
+        min=1.0,
+        max=10080.0
+    )
+
+    retention_max_count: IntProperty(
+        name="Max Snapshots per Object",
+        description="Delete the oldest snapshots of an object beyond this count (0 for no limit)",
+        default=0,
+        min=0,
+        max=100000
+    )
+
+    retention_max_mb: FloatProperty(
+        name="Max MB per Object",
+        description="Delete the oldest snapshots of an object once its files exceed this size (0 for no limit)",
+        default=0.0,
+        min=0.0,
+        max=1000000.0
+    )
+
+    retention_thinning: BoolProperty(
+        name="Thin Out Old Snapshots",
+        description="Keep every snapshot from the last hour, one per hour for the last day and one per day before that",
+        default=False
+    )
+
+    orphan_min_age_days: FloatProperty(
+        name="Orphan Age (days)",
+        description="Delete files in the save directory no open scene refers to once they are this old. "
+                    "Snapshots of closed .blend files count as orphans too (0 to never delete orphans)",
+        default=7.0,
+        min=0.0,
+        max=3650.0
+    )
+
     show_vertex_count: BoolProperty(
         name="Show Vertex Count",
         description="Show the number of vertices and faces on snapshots",
@@ -48,8 +320,74 @@ class MeshHistoryPreferences(AddonPreferences):
         row = box.row()
         row.label(text=f"Current Location: {self.storage_path}", icon='INFO')
         
+        box = layout.box()
+        box.label(text="Storage:", icon='DISK_DRIVE')
+        box.prop(self, "unchanged_save_action")
+        box.prop(self, "capture_attributes")
+        box.prop(self, "use_chunk_store")
+        row = box.row(align=True)
+        row.prop(self, "use_pack_store")
+        sub = row.row(align=True)
+        sub.enabled = self.use_pack_store
+        sub.prop(self, "pack_scope", text="")
+        box.prop(self, "background_writes")
+        col = box.column(align=True)
+        col.enabled = self.background_writes
+        col.prop(self, "writer_threads")
+        col.prop(self, "max_pending_writes")
+        row = box.row(align=True)
+        row.prop(self, "compression_codec")
+        sub = row.row(align=True)
+        sub.enabled = self.compression_codec != 'NONE'
+        sub.prop(self, "compression_level", text="Level")
+        box.prop(self, "position_quantization")
+        col = box.column(align=True)
+        col.enabled = self.position_quantization != 'NONE'
+        col.prop(self, "quantize_autosaves_only")
+        col.prop(self, "quantization_max_error")
+        box.prop(self, "use_delta_snapshots")
+        row = box.row()
+        row.enabled = self.use_delta_snapshots
+        row.prop(self, "keyframe_interval")
+        
+        box = layout.box()
+        box.label(text="Auto Snapshots:", icon='TIME')
+        box.prop(self, "autosave_enabled")
+        col = box.column(align=True)
+        col.enabled = self.autosave_enabled
+        col.prop(self, "autosave_interval")
+        col.prop(self, "autosave_max_mb_per_minute")
+        col.prop(self, "autosave_max_concurrent_writes")
+        
+        box = layout.box()
+        box.label(text="Retention:", icon='TRASH')
+        box.prop(self, "retention_max_count")
+        box.prop(self, "retention_max_mb")
+        box.prop(self, "retention_thinning")
+        box.prop(self, "orphan_min_age_days")
+        box.prop(self, "retention_enabled")
+        row = box.row()
+        row.enabled = self.retention_enabled
+        row.prop(self, "retention_interval")
+        
+        box = layout.box()
+        box.label(text="Memory:", icon='MEMORY')
+        box.prop(self, "cache_budget_mb")
+        box.prop(self, "cache_new_snapshots")
+        
+        box = layout.box()
+        box.label(text="Large Meshes:", icon='MESH_DATA')
+        box.prop(self, "stream_threshold_mb")
+        col = box.column(align=True)
+        col.enabled = self.stream_threshold_mb > 0
+        col.prop(self, "stream_chunk_mb")
+        col.prop(self, "direct_mesh_access")
+        
         box = layout.box()
         box.label(text="Visualization:", icon='WINDOW')
+        box.prop(self, "list_rows")
+        box.prop(self, "scrub_interpolate")
+        box.prop(self, "scrub_prefetch")
         box.prop(self, "show_vertex_count")
         box.prop(self, "show_file_size")
         
@@ -0,0 +1,149 @@
+import bpy
+import time
+from bpy.app.handlers import persistent
+from datetime import datetime
+
+from . import mesh_attributes
+from . import utils
+from . import writer
+from .addon_preferences import get_preferences
+
+
+MEGABYTE = 1024 * 1024
+IDLE_INTERVAL = 5.0
+RETRY_INTERVAL = 1.0
+
+_dirty = set()
+_in_flight = set()
+_budget = {"bytes": 0.0, "refilled": None}
+
+
+@persistent
+def _track_geometry_updates(scene, depsgraph):
+    for update in depsgraph.updates:
+        if not update.is_updated_geometry:
+            continue
+        data = update.id
+        if isinstance(data, bpy.types.Mesh):
+            mesh_attributes.forget_vertex_groups(data.original)
+        elif isinstance(data, bpy.types.Object) and data.type == 'MESH':
+            obj = data.original
+            _dirty.add(obj.name)
+            # Vertex group operators and VertexGroup.add/remove may tag
+            # only the object, in any mode.
+            mesh_attributes.forget_vertex_groups(obj.data)
+
+
+@persistent
+def _reset_on_load(*args):
+    _dirty.clear()
+    _in_flight.clear()
+    mesh_attributes.forget_vertex_groups()
+
+
+@persistent
+def _forget_weights(*args):
+    mesh_attributes.forget_vertex_groups()
+
+
+def _refill_budget(prefs):
+    capacity = prefs.autosave_max_mb_per_minute * MEGABYTE
+    now = time.monotonic()
+    refilled = _budget["refilled"]
+    if refilled is None:
+        _budget["bytes"] = capacity
+    else:
+        _budget["bytes"] = min(_budget["bytes"] + (now - refilled) * capacity / 60.0, capacity)
+    _budget["refilled"] = now
+    return capacity
+
+
+def autosave_object(scene, obj, prefs):
+    latest = utils.find_latest_snapshot(scene, obj.name)
+    direct = prefs.direct_mesh_access and utils.should_stream(utils.estimate_mesh_size(obj.data), prefs)
+    if latest is not None and utils.mesh_matches_snapshot(obj, latest, direct):
+        return None
+
+    mesh_data = utils.capture_for_snapshot(obj, prefs)
+    name = f"{obj.name}_auto_{datetime.now().strftime('%H%M%S')}"
+    snapshot = utils.add_snapshot(
+        scene, obj, mesh_data, name, prefs, background=True, is_autosave=True
+    )
+    return snapshot.filepath
+
+
+def _tick():
+    try:
+        prefs = get_preferences()
+    except KeyError:
+        return IDLE_INTERVAL
+
+    if not prefs.autosave_enabled:
+        return IDLE_INTERVAL
+    if not _dirty:
+        return prefs.autosave_interval
+
+    scene = bpy.context.scene
+    if scene is None:
+        return RETRY_INTERVAL
+
+    capacity = _refill_budget(prefs)
+    _in_flight.intersection_update(writer.pending_paths())
+
+    deferred = False
+    for name in sorted(_dirty):
+        if len(_in_flight) >= prefs.autosave_max_concurrent_writes:
+            deferred = True
+            break
+
+        obj = scene.objects.get(name)
+        if obj is None or obj.type != 'MESH':
+            _dirty.discard(name)
+            continue
+        if obj.mode == 'EDIT':
+            # obj.data lags behind the edit mesh; try again after the
+            # object leaves Edit Mode.
+            continue
+
+        # A mesh bigger than the whole budget still goes through once
+        # the budget is full, otherwise it could never be saved.
+        cost = utils.estimate_mesh_size(obj.data)
+        if cost > _budget["bytes"] and _budget["bytes"] < capacity:
+            deferred = True
+            break
+
+        _dirty.discard(name)
+        try:
+            filepath = autosave_object(scene, obj, prefs)
+        except Exception as e:
+            print(f"Mesh History: Autosave of '{name}' failed: {e}")
+            continue
+
+        if filepath:
+            _budget["bytes"] -= cost
+            _in_flight.add(filepath)
+
+    return RETRY_INTERVAL if deferred else prefs.autosave_interval
+
+
+def register():
+    bpy.app.handlers.depsgraph_update_post.append(_track_geometry_updates)
+    bpy.app.handlers.load_post.append(_reset_on_load)
+    bpy.app.handlers.undo_post.append(_forget_weights)
+    bpy.app.handlers.redo_post.append(_forget_weights)
+    bpy.app.timers.register(_tick, first_interval=IDLE_INTERVAL, persistent=True)
+
+
+def unregister():
+    if bpy.app.timers.is_registered(_tick):
+        bpy.app.timers.unregister(_tick)
+    if _reset_on_load in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(_reset_on_load)
+    for handlers in (bpy.app.handlers.undo_post, bpy.app.handlers.redo_post):
+        if _forget_weights in handlers:
+            handlers.remove(_forget_weights)
+    if _track_geometry_updates in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.remove(_track_geometry_updates)
+    _dirty.clear()
+    _in_flight.clear()
+    mesh_attributes.forget_vertex_groups()
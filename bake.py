@@ -0,0 +1,76 @@
+import numpy as np
+
+from . import utils
+from . import writer
+
+
+def bakeable(obj, snapshots):
+    # Shape keys store one position per vertex of the mesh, so only
+    # snapshots with the same vertex count can become keys.
+    vertex_count = len(obj.data.vertices)
+    return [
+        snapshot for snapshot in snapshots
+        if snapshot.write_state == 'WRITTEN' and snapshot.vertex_count == vertex_count
+    ]
+
+
+def _key_name(name, taken):
+    # Snapshot names repeat (after deletes, or auto snapshots on another
+    # day), so every snapshot of a bake gets a key of its own.
+    unique = name
+    suffix = 1
+    while unique in taken:
+        unique = f"{name}.{suffix:03d}"
+        suffix += 1
+    return unique
+
+
+def _shape_key(obj, name, taken):
+    if obj.data.shape_keys is None:
+        obj.shape_key_add(name="Basis", from_mix=False)
+    shape_keys = obj.data.shape_keys
+
+    # A key left by an earlier bake is overwritten, the reference key
+    # never is.
+    name = _key_name(name, taken | {shape_keys.reference_key.name})
+    taken.add(name)
+    key = shape_keys.key_blocks.get(name)
+    if key is None:
+        key = obj.shape_key_add(name=name, from_mix=False)
+    return key
+
+
+def _keyframe(key, frames, index):
+    # Each key is fully on at its own frame and off at its neighbours',
+    # so playback crossfades from one snapshot to the next.
+    for neighbour in (index - 1, index + 1):
+        if 0 <= neighbour < len(frames):
+            key.value = 0.0
+            key.keyframe_insert("value", frame=frames[neighbour])
+    key.value = 1.0
+    key.keyframe_insert("value", frame=frames[index])
+    key.value = 0.0
+
+
+def bake_shape_keys(obj, snapshots, prefs, keyframes=False, frame_start=1, frame_step=1):
+    entries = [(snapshot.name, snapshot.filepath) for snapshot in snapshots]
+    frames = [frame_start + i * frame_step for i in range(len(entries))]
+
+    # Decoded in batches of a few snapshots per worker, which keeps the
+    # decoders busy without holding every position array at once.
+    batch_size = max(prefs.writer_threads * 2, 1)
+    baked = []
+    taken = set()
+    for first in range(0, len(entries), batch_size):
+        batch = entries[first:first + batch_size]
+        loaded = writer.run_parallel(utils.load_mesh_snapshot, [filepath for _, filepath in batch])
+        for offset, ((name, _), mesh_data) in enumerate(zip(batch, loaded)):
+            key = _shape_key(obj, name, taken)
+            key.data.foreach_set("co", np.asarray(mesh_data["positions"], dtype=np.float32))
+            if keyframes:
+                _keyframe(key, frames, first + offset)
+            baked.append(key)
+        del loaded
+
+    obj.data.update()
+    return baked
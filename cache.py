@@ -0,0 +1,204 @@
+import bpy
+import os
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+
+import numpy as np
+
+from . import pack_store
+
+
+MEGABYTE = 1024 * 1024
+DEFAULT_BUDGET = 512 * MEGABYTE
+
+# Guards the cache and the sizes of its views, which grow as they are read.
+_lock = threading.RLock()
+
+
+def _frozen(array):
+    if not array.flags.owndata:
+        # Views into a mapped file must not outlive it.
+        array = np.array(array)
+    array.setflags(write=False)
+    return array
+
+
+class SnapshotView(Mapping):
+    # Read-only mesh data over a snapshot file, or any other mapping,
+    # whose arrays are decoded on first access: a restore that only needs
+    # positions never decodes the topology or the attribute layers.
+    # resolved holds values that replace those of source, such as the
+    # positions of a delta chain; keys for which exclude() is true are
+    # left out.
+    def __init__(self, source, resolved=None, exclude=None):
+        self._source = source
+        self._resolved = resolved or {}
+        self._exclude = exclude
+        self._keys = dict.fromkeys(self._resolved)
+        self._keys.update((key, None) for key in source if self._visible(key))
+        self._arrays = {}
+        self._cache = None
+        self.size = 0
+
+        # Arrays that are in memory already count from the start.
+        for key in self._keys if isinstance(source, dict) else self._resolved:
+            value = self._resolved[key] if key in self._resolved else source[key]
+            if isinstance(value, np.ndarray):
+                self._keep(key, value)
+
+    def _visible(self, key):
+        return self._exclude is None or not self._exclude(key)
+
+    def _keep(self, key, value):
+        value = _frozen(value)
+        with _lock:
+            kept = self._arrays.setdefault(key, value)
+            if kept is value:
+                self.size += value.nbytes
+                if self._cache is not None:
+                    self._cache._grow(value.nbytes)
+            return kept
+
+    def __getitem__(self, key):
+        array = self._arrays.get(key)
+        if array is not None:
+            return array
+        if key not in self._keys:
+            raise KeyError(key)
+
+        value = self._resolved[key] if key in self._resolved else self._source[key]
+        if isinstance(value, np.ndarray):
+            return self._keep(key, value)
+        return value
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def close(self):
+        # Releases the mapped file; arrays read so far stay usable.
+        if hasattr(self._source, "close"):
+            self._source.close()
+
+
+class SnapshotCache:
+    def __init__(self, budget=DEFAULT_BUDGET):
+        self.budget = budget
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = _lock
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _key(self, filepath):
+        version = pack_store.version(filepath)
+        if version is None:
+            return None
+        return os.path.abspath(filepath), version
+
+    def get(self, filepath):
+        key = self._key(filepath)
+        with self._lock:
+            entry = self._entries.get(key) if key is not None else None
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, filepath, view):
+        # Only the arrays read from the view count toward the budget, as
+        # they are read.
+        key = self._key(filepath)
+        if key is None or view.size > self.budget:
+            return view
+
+        with self._lock:
+            self._discard(key[0])
+            self._entries[key] = view
+            view._cache = self
+            self.size += view.size
+            self._evict()
+        return view
+
+    def _grow(self, nbytes):
+        self.size += nbytes
+        self._evict()
+
+    def _discard(self, path):
+        for key in [key for key in self._entries if key[0] == path]:
+            self._drop(key).close()
+
+    def _drop(self, key):
+        # Evicted views stay open for whoever still reads them; the file
+        # is released once they are collected.
+        view = self._entries.pop(key)
+        view._cache = None
+        self.size -= view.size
+        return view
+
+    def _evict(self):
+        while self.size > self.budget and self._entries:
+            self._drop(next(iter(self._entries)))
+
+    def invalidate(self, filepath):
+        with self._lock:
+            self._discard(os.path.abspath(filepath))
+
+    def set_budget(self, budget):
+        with self._lock:
+            self.budget = budget
+            self._evict()
+
+    def close_files(self):
+        # Files cannot be replaced or deleted on every platform while they
+        # are mapped, so this runs before packs are rewritten.
+        with self._lock:
+            for key in list(self._entries):
+                self._drop(key).close()
+
+    def clear(self):
+        self.close_files()
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+
+snapshot_cache = SnapshotCache()
+
+
+def update_budget(prefs):
+    snapshot_cache.set_budget(prefs.cache_budget_mb * MEGABYTE)
+
+
+def _configure():
+    from .addon_preferences import get_preferences
+
+    try:
+        update_budget(get_preferences())
+    except KeyError:
+        # Preferences are not available yet on the very first enable;
+        # the default budget stays in place until they are changed.
+        pass
+    return None
+
+
+def register():
+    bpy.app.timers.register(_configure, first_interval=0.0)
+
+
+def unregister():
+    if bpy.app.timers.is_registered(_configure):
+        bpy.app.timers.unregister(_configure)
+    snapshot_cache.clear()
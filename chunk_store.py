@@ -0,0 +1,181 @@
+import hashlib
+import json
+import mmap
+import os
+import threading
+
+import numpy as np
+
+from . import compression
+
+
+CHUNK_DIR = "chunks"
+REFS_FILENAME = "refs.json"
+
+# Arrays smaller than this stay inline in the snapshot file; hashing and
+# an extra file would cost more than they save.
+MIN_CHUNK_BYTES = 64 * 1024
+
+
+class ChunkStore:
+    def __init__(self, storage_dir):
+        self.root = os.path.join(storage_dir, CHUNK_DIR)
+        self.refs_path = os.path.join(self.root, REFS_FILENAME)
+        self._lock = threading.Lock()
+        self._refs = None
+        # digest -> number of writes that stored it but have not added
+        # their reference yet; such chunks must survive a release.
+        self._in_flight = {}
+        self._writes = threading.local()
+
+    def chunk_path(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def _load_refs(self):
+        if self._refs is None:
+            try:
+                with open(self.refs_path, 'r', encoding='utf-8') as f:
+                    self._refs = json.load(f)
+            except FileNotFoundError:
+                self._refs = {}
+        return self._refs
+
+    def _save_refs(self):
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = self.refs_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._refs, f)
+        os.replace(tmp_path, self.refs_path)
+
+    def put(self, array, codec=None, level=0, batch_size=None):
+        array = np.ascontiguousarray(array)
+        key = array.dtype.str
+        if codec is not None:
+            # Compressed chunks differ per codec and level, so they must
+            # not collide with the raw chunk of the same array.
+            key += f"|{codec}:{level}"
+        digest = hashlib.blake2b(key.encode('ascii'), digest_size=20)
+        digest.update(array.data)
+        digest = digest.hexdigest()
+
+        path = self.chunk_path(digest)
+        # Inside begin_write() the chunk stays pinned until end_write(), so
+        # neither a release on another thread nor the orphan sweep deletes
+        # it before the snapshot being written adds its reference.
+        with self._lock:
+            pinned = getattr(self._writes, "digests", None)
+            if pinned is not None:
+                pinned.append(digest)
+                self._in_flight[digest] = self._in_flight.get(digest, 0) + 1
+            try:
+                os.utime(path)
+                return digest, 0, 0
+            except FileNotFoundError:
+                pass
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            if codec is not None:
+                compression.write_framed(f, array.data, codec, level, batch_size)
+            else:
+                f.write(array.data)
+        os.replace(tmp_path, path)
+        return digest, os.path.getsize(path), array.nbytes
+
+    def begin_write(self):
+        self._writes.digests = []
+
+    def end_write(self):
+        # Called once the written snapshot holds its references, or after
+        # the write failed.
+        digests = getattr(self._writes, "digests", None) or []
+        self._writes.digests = None
+        with self._lock:
+            for digest in digests:
+                count = self._in_flight.get(digest, 0) - 1
+                if count > 0:
+                    self._in_flight[digest] = count
+                else:
+                    self._in_flight.pop(digest, None)
+
+    def open(self, digest, dtype, count, codec=None):
+        dtype = np.dtype(dtype)
+        if count == 0:
+            return np.empty(0, dtype=dtype), None
+
+        with open(self.chunk_path(digest), 'rb') as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if codec is not None:
+            with buffer:
+                return compression.decode(buffer, codec, dtype, count), None
+
+        return np.frombuffer(buffer, dtype=dtype, count=count), buffer
+
+    def read_into(self, digest, raw, codec=None, chunk_size=compression.FRAME_SIZE):
+        if not len(raw):
+            return
+
+        with open(self.chunk_path(digest), 'rb') as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        with buffer:
+            if codec is not None:
+                compression.decode_into(buffer, codec, raw)
+            else:
+                compression.copy_into(buffer, 0, raw, chunk_size)
+
+    def add_refs(self, digests):
+        if not digests:
+            return
+        with self._lock:
+            refs = self._load_refs()
+            for digest in digests:
+                refs[digest] = refs.get(digest, 0) + 1
+            self._save_refs()
+
+    def release(self, digests):
+        if not digests:
+            return
+        with self._lock:
+            refs = self._load_refs()
+            for digest in digests:
+                count = refs.get(digest, 0) - 1
+                if count > 0:
+                    refs[digest] = count
+                    continue
+
+                refs.pop(digest, None)
+                if digest in self._in_flight:
+                    continue
+                try:
+                    os.remove(self.chunk_path(digest))
+                except FileNotFoundError:
+                    pass
+            self._save_refs()
+
+    def remove_orphan(self, name, cutoff):
+        # name is a chunk digest, or a temporary file left by a failed put.
+        with self._lock:
+            if name in self._load_refs() or name in self._in_flight:
+                return False
+            path = os.path.join(self.root, name[:2], name)
+            if os.stat(path).st_mtime > cutoff:
+                return False
+            os.remove(path)
+            return True
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(storage_dir):
+    key = os.path.abspath(storage_dir)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = ChunkStore(key)
+            _stores[key] = store
+        return store
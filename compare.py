@@ -0,0 +1,116 @@
+import os
+from collections import OrderedDict
+
+import numpy as np
+from mathutils.kdtree import KDTree
+
+from . import mesh_attributes
+from . import mesh_buffers
+from . import pack_store
+from . import utils
+
+
+# Trees are only needed when the topology changed, and building one
+# takes a pass over every vertex, so the last few are kept.
+TREE_CACHE_SIZE = 2
+
+_trees = OrderedDict()
+# snapshot path -> stats of its last comparison
+_results = {}
+
+
+def _snapshot_tree(filepath, positions):
+    key = (os.path.abspath(filepath), pack_store.version(filepath))
+    tree = _trees.get(key)
+    if tree is not None:
+        _trees.move_to_end(key)
+        return tree
+
+    vectors = positions.reshape(-1, 3)
+    tree = KDTree(len(vectors))
+    for index, co in enumerate(vectors.tolist()):
+        tree.insert(co, index)
+    tree.balance()
+
+    _trees[key] = tree
+    while len(_trees) > TREE_CACHE_SIZE:
+        _trees.popitem(last=False)
+    return tree
+
+
+def displacement(obj, mesh_data, filepath, direct=False):
+    # Distance of every vertex of the mesh from where the snapshot has
+    # it, or from the nearest snapshot vertex when the topology differs.
+    utils.sync_edit_mesh(obj)
+    mesh = obj.data
+    current = mesh_buffers.read(mesh, "positions", direct).reshape(-1, 3)
+    stored = np.asarray(mesh_data["positions"], dtype=np.float32).reshape(-1, 3)
+
+    if utils.topology_matches(mesh, mesh_data, direct):
+        offsets = current - stored
+        return np.sqrt(np.einsum('ij,ij->i', offsets, offsets)), True
+
+    if not len(stored):
+        raise ValueError("The snapshot has no vertices to compare with")
+
+    tree = _snapshot_tree(filepath, stored)
+    distances = np.fromiter(
+        (tree.find(co)[2] for co in current.tolist()),
+        dtype=np.float64,
+        count=len(current)
+    )
+    return distances, False
+
+
+def summarize(distances, tolerance):
+    if not len(distances):
+        return {"count": 0, "moved": 0, "max": 0.0, "mean": 0.0, "rms": 0.0}
+    return {
+        "count": len(distances),
+        "moved": int(np.count_nonzero(distances > tolerance)),
+        "max": float(distances.max()),
+        "mean": float(distances.mean()),
+        "rms": float(np.sqrt(np.mean(np.square(distances, dtype=np.float64)))),
+    }
+
+
+def write_heatmap(mesh, distances):
+    name = mesh_attributes.DIFF_ATTRIBUTE
+    attribute = mesh.attributes.get(name)
+    if attribute is not None and (attribute.domain != 'POINT' or attribute.data_type != 'FLOAT_COLOR'):
+        mesh.attributes.remove(attribute)
+        attribute = None
+    if attribute is None:
+        attribute = mesh.attributes.new(name, 'FLOAT_COLOR', 'POINT')
+
+    # Blue for unmoved vertices through green to red for the largest
+    # displacement.
+    peak = distances.max() if len(distances) else 0.0
+    ratio = (distances / peak if peak > 0.0 else np.zeros(len(distances))).astype(np.float32)
+    colors = np.empty((len(distances), 4), dtype=np.float32)
+    colors[:, 0] = ratio
+    colors[:, 1] = 1.0 - np.abs(2.0 * ratio - 1.0)
+    colors[:, 2] = 1.0 - ratio
+    colors[:, 3] = 1.0
+    attribute.data.foreach_set("color", colors.ravel())
+
+    mesh.color_attributes.active_color_name = name
+    mesh.update()
+
+
+def compare_snapshot(obj, snapshot, prefs, tolerance, heatmap=False):
+    mesh_data = utils.load_mesh_snapshot(snapshot.filepath)
+    direct = prefs.direct_mesh_access and utils.should_stream(snapshot.raw_size, prefs)
+    distances, same_topology = displacement(obj, mesh_data, snapshot.filepath, direct)
+
+    stats = summarize(distances, tolerance)
+    stats["same_topology"] = same_topology
+    _results[os.path.abspath(snapshot.filepath)] = stats
+
+    if heatmap:
+        write_heatmap(obj.data, distances)
+    return stats
+
+
+def last_result(filepath):
+    return _results.get(os.path.abspath(filepath))
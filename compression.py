@@ -0,0 +1,158 @@
+import bz2
+import lzma
+import os
+import struct
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+FRAME_SIZE = 1024 * 1024
+
+# frame count, then (compressed size, raw size) per frame
+FRAME_COUNT = struct.Struct("<I")
+FRAME_ENTRY = struct.Struct("<QQ")
+
+CODECS = {
+    "zlib": (
+        lambda data, level: zlib.compress(data, level),
+        zlib.decompress,
+    ),
+    "lzma": (
+        lambda data, level: lzma.compress(data, preset=level),
+        lzma.decompress,
+    ),
+    "bz2": (
+        lambda data, level: bz2.compress(data, compresslevel=max(level, 1)),
+        bz2.decompress,
+    ),
+}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+
+    # The stdlib codecs release the GIL while they work, so a thread
+    # pool spreads frames across all cores without pickling buffers
+    # to worker processes.
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=os.cpu_count() or 1,
+                thread_name_prefix="mesh_history_codec"
+            )
+        return _pool
+
+
+def encode_frames(data, codec, level, batch_size=None):
+    compress = CODECS[codec][0]
+    data = memoryview(data).cast('B')
+    frames = [data[i:i + FRAME_SIZE] for i in range(0, len(data), FRAME_SIZE)]
+
+    # Only batch_size bytes of frames are compressed at a time, so the
+    # compressed output held in memory stays bounded for huge arrays.
+    batch = max((batch_size or len(data)) // FRAME_SIZE, 1)
+    for start in range(0, len(frames), batch):
+        group = frames[start:start + batch]
+        if len(group) > 1:
+            compressed = list(_get_pool().map(lambda frame: compress(frame, level), group))
+        else:
+            compressed = [compress(frame, level) for frame in group]
+
+        for frame, packed in zip(group, compressed):
+            yield packed, len(frame)
+
+
+def encode(data, codec, level):
+    compressed = list(encode_frames(data, codec, level))
+
+    header = bytearray(FRAME_COUNT.pack(len(compressed)))
+    for packed, raw_size in compressed:
+        header += FRAME_ENTRY.pack(len(packed), raw_size)
+
+    return [bytes(header)] + [packed for packed, _raw_size in compressed]
+
+
+def write_framed(f, data, codec, level, batch_size=None):
+    frame_count = -(-len(memoryview(data).cast('B')) // FRAME_SIZE)
+    table_start = f.tell()
+    f.write(b"\0" * (FRAME_COUNT.size + frame_count * FRAME_ENTRY.size))
+
+    table = bytearray(FRAME_COUNT.pack(frame_count))
+    for packed, raw_size in encode_frames(data, codec, level, batch_size):
+        f.write(packed)
+        table += FRAME_ENTRY.pack(len(packed), raw_size)
+
+    end = f.tell()
+    f.seek(table_start)
+    f.write(table)
+    f.seek(end)
+
+
+def decode(buffer, codec, dtype, count, frames=None):
+    dtype = np.dtype(dtype)
+    out = np.empty(count, dtype=dtype)
+    decode_into(buffer, codec, out.view(np.uint8), frames)
+    return out
+
+
+def decode_into(buffer, codec, raw, frames=None):
+    with memoryview(buffer) as view:
+        _decode_into(view.cast('B'), CODECS[codec][1], raw, frames)
+
+
+def copy_into(buffer, offset, raw, chunk_size):
+    for start in range(0, len(raw), chunk_size):
+        size = min(chunk_size, len(raw) - start)
+        raw[start:start + size] = np.frombuffer(
+            buffer, dtype=np.uint8, count=size, offset=offset + start
+        )
+
+
+def _decode_into(buffer, decompress, raw, frames=None):
+    # Streamed blocks keep their frame table in the snapshot metadata
+    # instead of in front of the frames.
+    if frames is None:
+        (frame_count,) = FRAME_COUNT.unpack_from(buffer, 0)
+        frames = [
+            FRAME_ENTRY.unpack_from(buffer, FRAME_COUNT.size + i * FRAME_ENTRY.size)
+            for i in range(frame_count)
+        ]
+        position = FRAME_COUNT.size + frame_count * FRAME_ENTRY.size
+    else:
+        position = 0
+
+    raw_position = 0
+    jobs = []
+    for packed_size, raw_size in frames:
+        jobs.append((position, packed_size, raw_position, raw_size))
+        position += packed_size
+        raw_position += raw_size
+
+    if raw_position != len(raw):
+        raise ValueError("Compressed block does not match its declared size")
+
+    def decode_frame(job):
+        start, packed_size, raw_start, raw_size = job
+        frame = decompress(buffer[start:start + packed_size])
+        raw[raw_start:raw_start + raw_size] = np.frombuffer(frame, dtype=np.uint8)
+
+    if len(jobs) > 1:
+        list(_get_pool().map(decode_frame, jobs))
+    else:
+        for job in jobs:
+            decode_frame(job)
+
+
+def shutdown():
+    global _pool
+
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True)
+            _pool = None
@@ -0,0 +1,161 @@
+import json
+import os
+import threading
+
+from . import pack_store
+from . import snapshot_format
+
+
+MANIFEST_FILENAME = "manifest.jsonl"
+
+SUMMARY_KEYS = (
+    "name",
+    "object_name",
+    "timestamp",
+    "set_id",
+    "is_autosave",
+    "vertex_count",
+    "face_count",
+    "topology_hash",
+    "positions_hash",
+    "attributes_hash",
+    "parent",
+    "error_bound",
+)
+
+# Rewriting drops superseded records once there are more of them than
+# live entries, so the journal stays proportional to the snapshot count.
+MIN_COMPACT_RECORDS = 64
+
+
+def summarize(mesh_data, file_size, raw_size):
+    summary = {key: mesh_data[key] for key in SUMMARY_KEYS if key in mesh_data}
+    summary["file_size"] = file_size
+    summary["raw_size"] = raw_size
+    return summary
+
+
+class Manifest:
+    def __init__(self, storage_dir):
+        self.root = storage_dir
+        self.path = os.path.join(storage_dir, MANIFEST_FILENAME)
+        self._lock = threading.Lock()
+        self._entries = None
+        self._records = 0
+
+    def _load(self):
+        if self._entries is not None:
+            return self._entries
+
+        self._entries = {}
+        self._records = 0
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A record cut short by a crash; the file it
+                        # describes is picked up again by refresh().
+                        continue
+                    self._apply(record)
+        except FileNotFoundError:
+            pass
+        return self._entries
+
+    def _apply(self, record):
+        filename = record.pop("file")
+        if record.pop("removed", False):
+            self._entries.pop(filename, None)
+        else:
+            self._entries[filename] = record
+        self._records += 1
+
+    def _append(self, record):
+        os.makedirs(self.root, exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._apply(dict(record))
+
+        if self._records > max(2 * len(self._entries), MIN_COMPACT_RECORDS):
+            self._compact()
+
+    def _compact(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for filename, summary in self._entries.items():
+                f.write(json.dumps(dict(summary, file=filename), ensure_ascii=False) + "\n")
+        os.replace(tmp_path, self.path)
+        self._records = len(self._entries)
+
+    def record(self, filename, summary):
+        with self._lock:
+            self._load()
+            self._append(dict(summary, file=filename))
+
+    def remove(self, filename):
+        with self._lock:
+            if filename in self._load():
+                self._append({"file": filename, "removed": True})
+
+    def entries(self):
+        with self._lock:
+            return dict(self._load())
+
+    def stats(self):
+        with self._lock:
+            entries = self._load()
+            return len(entries), sum(entry.get("file_size", 0) for entry in entries.values())
+
+    def refresh(self):
+        # One directory listing plus a header read for files the journal
+        # does not know yet; payloads are never touched.
+        try:
+            with os.scandir(self.root) as scan:
+                names = {
+                    entry.name for entry in scan
+                    if entry.name.endswith(snapshot_format.FILE_EXTENSION) and entry.is_file()
+                }
+        except FileNotFoundError:
+            names = set()
+
+        for pack in pack_store.find_packs(self.root):
+            pack_name = os.path.basename(pack.path)
+            names.update(pack_store.make_ref(pack_name, name) for name in pack.entries())
+
+        with self._lock:
+            entries = self._load()
+            missing = [name for name in entries if name not in names]
+            unknown = [name for name in names if name not in entries]
+
+        found = {}
+        for name in unknown:
+            try:
+                summary = snapshot_format.read_snapshot_summary(os.path.join(self.root, name))
+            except (OSError, ValueError) as e:
+                print(f"Mesh History: Skipping unreadable snapshot '{name}': {e}")
+                continue
+            found[name] = summarize(summary, summary["file_size"], summary["raw_size"])
+
+        with self._lock:
+            entries = self._load()
+            if missing or found:
+                for name in missing:
+                    entries.pop(name, None)
+                entries.update(found)
+                self._compact()
+            return dict(entries)
+
+
+_manifests = {}
+_manifests_lock = threading.Lock()
+
+
+def get_manifest(storage_dir):
+    key = os.path.abspath(storage_dir)
+    with _manifests_lock:
+        manifest = _manifests.get(key)
+        if manifest is None:
+            manifest = Manifest(key)
+            _manifests[key] = manifest
+        return manifest
@@ -0,0 +1,293 @@
+import hashlib
+
+import numpy as np
+
+
+ATTRIBUTE_PREFIX = "attribute:"
+# Heatmap written by Compare with Current; never stored in snapshots
+DIFF_ATTRIBUTE = "Mesh History Diff"
+# Sparse vertex group weights: one row per (vertex, group) pair
+VERTEX_GROUP_KEYS = (
+    "vertex_groups:vertices",
+    "vertex_groups:groups",
+    "vertex_groups:weights",
+)
+
+# mesh pointer -> ((group names, vertex count), weights hash, weights).
+# Walking the weights is by far the slowest part of attributes_hash()
+# and of masking by a vertex group, so both are kept until the weights
+# of the mesh may have changed.
+_group_hashes = {}
+
+# attribute data type -> (foreach property, dtype, values per element)
+DATA_TYPES = {
+    'FLOAT': ("value", np.float32, 1),
+    'INT': ("value", np.int32, 1),
+    'INT8': ("value", np.int32, 1),
+    'BOOLEAN': ("value", bool, 1),
+    'FLOAT2': ("vector", np.float32, 2),
+    'INT32_2D': ("value", np.int32, 2),
+    'FLOAT_VECTOR': ("vector", np.float32, 3),
+    'FLOAT_COLOR': ("color", np.float32, 4),
+    'BYTE_COLOR': ("color", np.float32, 4),
+    'QUATERNION': ("value", np.float32, 4),
+    'FLOAT4X4': ("value", np.float32, 16),
+}
+
+
+def array_hash(array):
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(array.dtype.str.encode('ascii'))
+    digest.update(np.ascontiguousarray(array))
+    return digest.hexdigest()
+
+
+def is_layer_key(key):
+    return key.startswith(ATTRIBUTE_PREFIX) or key in VERTEX_GROUP_KEYS
+
+
+def layer_keys(mesh_data):
+    keys = [ATTRIBUTE_PREFIX + layer["name"] for layer in mesh_data.get("attributes", ())]
+    if mesh_data.get("vertex_groups"):
+        keys.extend(VERTEX_GROUP_KEYS)
+    return keys
+
+
+def _stored_attributes(mesh):
+    # Positions and connectivity are captured separately; selection,
+    # hide flags and other internal layers are not worth restoring.
+    for attribute in mesh.attributes:
+        if attribute.is_internal or attribute.is_required or attribute.name == DIFF_ATTRIBUTE:
+            continue
+        if attribute.data_type in DATA_TYPES:
+            yield attribute
+
+
+def has_layers(obj):
+    return len(obj.vertex_groups) > 0 or any(True for _ in _stored_attributes(obj.data))
+
+
+def read_attribute(attribute):
+    prop, dtype, width = DATA_TYPES[attribute.data_type]
+    array = np.empty(len(attribute.data) * width, dtype=dtype)
+    attribute.data.foreach_get(prop, array)
+    return array
+
+
+def read_vertex_groups(obj):
+    # Group membership has no bulk accessor, so this walks the vertices.
+    vertices = []
+    groups = []
+    weights = []
+    for vertex in obj.data.vertices:
+        for element in vertex.groups:
+            vertices.append(vertex.index)
+            groups.append(element.group)
+            weights.append(element.weight)
+    return (
+        np.array(vertices, dtype=np.int32),
+        np.array(groups, dtype=np.int32),
+        np.array(weights, dtype=np.float32),
+    )
+
+
+def _vertex_groups_hash(names, arrays):
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update("\0".join(names).encode('utf-8'))
+    for array in arrays:
+        digest.update(array_hash(array).encode('ascii'))
+    return digest.hexdigest()
+
+
+def _group_signature(obj, names):
+    return obj.data.as_pointer(), (tuple(names), len(obj.data.vertices))
+
+
+def _remember_vertex_groups(obj, names, arrays):
+    key, signature = _group_signature(obj, names)
+    digest = _vertex_groups_hash(names, arrays)
+    _group_hashes[key] = (signature, digest, arrays)
+    return digest
+
+
+def _cached_vertex_groups(obj, names):
+    key, signature = _group_signature(obj, names)
+    cached = _group_hashes.get(key)
+    if cached is None or cached[0] != signature:
+        arrays = read_vertex_groups(obj)
+        _remember_vertex_groups(obj, names, arrays)
+        cached = _group_hashes[key]
+    return cached[1], cached[2]
+
+
+def vertex_group_arrays(obj):
+    # The sparse (vertex, group, weight) rows of the object, read once and
+    # reused until its weights may have changed.
+    return _cached_vertex_groups(obj, [group.name for group in obj.vertex_groups])[1]
+
+
+def forget_vertex_groups(mesh=None):
+    if mesh is None:
+        _group_hashes.clear()
+    else:
+        _group_hashes.pop(mesh.as_pointer(), None)
+
+
+def _layer_signature(layer):
+    return f"{layer['name']}\0{layer['domain']}\0{layer['data_type']}\0{layer['hash']}"
+
+
+def _summary_hash(layers, vertex_groups):
+    digest = hashlib.blake2b(digest_size=16)
+    for layer in layers:
+        digest.update(_layer_signature(layer).encode('utf-8'))
+    if vertex_groups:
+        digest.update(vertex_groups["hash"].encode('ascii'))
+    return digest.hexdigest()
+
+
+def _collect(obj, keep_arrays):
+    layers = []
+    arrays = {}
+    for attribute in _stored_attributes(obj.data):
+        array = read_attribute(attribute)
+        layers.append({
+            "name": attribute.name,
+            "domain": attribute.domain,
+            "data_type": attribute.data_type,
+            "hash": array_hash(array),
+        })
+        if keep_arrays:
+            arrays[ATTRIBUTE_PREFIX + attribute.name] = array
+
+    vertex_groups = None
+    if len(obj.vertex_groups):
+        names = [group.name for group in obj.vertex_groups]
+        if keep_arrays:
+            group_arrays = read_vertex_groups(obj)
+            digest = _remember_vertex_groups(obj, names, group_arrays)
+            arrays.update(zip(VERTEX_GROUP_KEYS, group_arrays))
+        else:
+            digest = _cached_vertex_groups(obj, names)[0]
+        vertex_groups = {"names": names, "hash": digest}
+
+    return layers, vertex_groups, arrays
+
+
+def capture(obj, mesh_data):
+    layers, vertex_groups, arrays = _collect(obj, True)
+    mesh_data["attributes"] = layers
+    if vertex_groups:
+        mesh_data["vertex_groups"] = vertex_groups
+    mesh_data["attributes_hash"] = _summary_hash(layers, vertex_groups)
+    mesh_data.update(arrays)
+
+
+def attributes_hash(obj):
+    layers, vertex_groups, _arrays = _collect(obj, False)
+    return _summary_hash(layers, vertex_groups)
+
+
+def changed_keys(mesh_data, previous):
+    # Layers of mesh_data that previous does not store identically.
+    stored = {layer["name"]: _layer_signature(layer) for layer in previous.get("attributes", ())}
+    keys = [
+        ATTRIBUTE_PREFIX + layer["name"] for layer in mesh_data.get("attributes", ())
+        if stored.get(layer["name"]) != _layer_signature(layer)
+    ]
+    vertex_groups = mesh_data.get("vertex_groups")
+    if vertex_groups and vertex_groups != previous.get("vertex_groups"):
+        keys.extend(VERTEX_GROUP_KEYS)
+    return keys
+
+
+def changed_layers(obj, mesh_data):
+    # Stored layers that differ from the mesh; reading a layer back is far
+    # cheaper than decoding the stored copy just to compare it.
+    mesh = obj.data
+    keys = []
+    for layer in mesh_data.get("attributes", ()):
+        attribute = mesh.attributes.get(layer["name"])
+        if (attribute is None or attribute.domain != layer["domain"]
+                or attribute.data_type != layer["data_type"]
+                or array_hash(read_attribute(attribute)) != layer["hash"]):
+            keys.append(ATTRIBUTE_PREFIX + layer["name"])
+
+    vertex_groups = mesh_data.get("vertex_groups")
+    if vertex_groups:
+        names = [group.name for group in obj.vertex_groups]
+        if _vertex_groups_hash(names, read_vertex_groups(obj)) != vertex_groups["hash"]:
+            keys.extend(VERTEX_GROUP_KEYS)
+    return keys
+
+
+def apply_attributes(mesh, mesh_data, arrays):
+    for layer in mesh_data.get("attributes", ()):
+        array = arrays.get(ATTRIBUTE_PREFIX + layer["name"])
+        if array is None:
+            continue
+
+        attribute = mesh.attributes.get(layer["name"])
+        if attribute is not None and (attribute.domain != layer["domain"]
+                                      or attribute.data_type != layer["data_type"]):
+            mesh.attributes.remove(attribute)
+            attribute = None
+        if attribute is None:
+            attribute = mesh.attributes.new(layer["name"], layer["data_type"], layer["domain"])
+        attribute.data.foreach_set(DATA_TYPES[layer["data_type"]][0], array)
+
+
+def _group_indices(obj, names):
+    # Stored group index -> index of the group with that name on obj.
+    indices = []
+    for name in names:
+        group = obj.vertex_groups.get(name)
+        if group is None:
+            group = obj.vertex_groups.new(name=name)
+        indices.append(group.index)
+    return np.array(indices, dtype=np.int32)
+
+
+def apply_vertex_groups(obj, mesh_data, arrays):
+    if VERTEX_GROUP_KEYS[0] not in arrays:
+        return
+
+    vertices, groups, weights = (arrays[key] for key in VERTEX_GROUP_KEYS)
+    mapping = _group_indices(obj, mesh_data["vertex_groups"]["names"])
+    groups = mapping[groups]
+    everything = list(range(len(obj.data.vertices)))
+
+    for group_index in np.unique(mapping):
+        group = obj.vertex_groups[int(group_index)]
+        group.remove(everything)
+
+        selected = groups == group_index
+        unique, inverse = np.unique(weights[selected], return_inverse=True)
+        order = np.argsort(inverse, kind='stable')
+        runs = np.split(vertices[selected][order], np.cumsum(np.bincount(inverse))[:-1])
+        # One call per distinct weight rather than per vertex.
+        for weight, members in zip(unique.tolist(), runs):
+            group.add(members.tolist(), weight, 'REPLACE')
+    forget_vertex_groups(obj.data)
+
+
+def apply_vertex_groups_bmesh(obj, bm, mesh_data, arrays):
+    # VertexGroup.add() refuses to run in Edit Mode; the edit mesh keeps
+    # the weights in its deform layer instead.
+    if VERTEX_GROUP_KEYS[0] not in arrays:
+        return
+
+    vertices, groups, weights = (arrays[key] for key in VERTEX_GROUP_KEYS)
+    mapping = _group_indices(obj, mesh_data["vertex_groups"]["names"])
+    restored = set(mapping.tolist())
+
+    layer = bm.verts.layers.deform.verify()
+    bm.verts.ensure_lookup_table()
+    verts = bm.verts
+    for vert in verts:
+        deform = vert[layer]
+        for group_index in restored.intersection(deform.keys()):
+            del deform[group_index]
+    for vertex, group, weight in zip(vertices.tolist(), mapping[groups].tolist(), weights.tolist()):
+        verts[vertex][layer][group] = weight
+    forget_vertex_groups(obj.data)
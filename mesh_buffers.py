@@ -0,0 +1,79 @@
+import ctypes
+
+import numpy as np
+
+
+# array key -> (mesh collection, foreach attribute, dtype, values per item)
+LAYOUTS = {
+    "positions": ("vertices", "co", np.float32, 3),
+    "edges": ("edges", "vertices", np.int32, 2),
+    "loops": ("loops", "vertex_index", np.int32, 1),
+    "loop_starts": ("polygons", "loop_start", np.int32, 1),
+}
+
+
+def _item_values(item, attribute):
+    value = getattr(item, attribute)
+    return tuple(value) if hasattr(value, "__len__") else (value,)
+
+
+def buffer_view(mesh, key):
+    collection_name, attribute, dtype, width = LAYOUTS[key]
+    collection = getattr(mesh, collection_name)
+    count = len(collection)
+    if count == 0:
+        return np.empty(0, dtype=dtype)
+
+    # Iterating the collection makes the array unique to this mesh, so
+    # writes through the view never leak into meshes sharing it.
+    stride = width * np.dtype(dtype).itemsize
+    first = collection[0]
+    last = collection[count - 1]
+    address = first.as_pointer()
+
+    # The items have to sit one stride apart in a single array; any other
+    # layout falls back to foreach_get/foreach_set.
+    if not address or last.as_pointer() != address + (count - 1) * stride:
+        return None
+    if count > 1 and collection[1].as_pointer() != address + stride:
+        return None
+
+    memory = (ctypes.c_byte * (count * stride)).from_address(address)
+    view = np.frombuffer(memory, dtype=dtype)
+    if (tuple(view[:width]) != _item_values(first, attribute)
+            or tuple(view[-width:]) != _item_values(last, attribute)):
+        return None
+    return view
+
+
+def read(mesh, key, direct=False):
+    view = buffer_view(mesh, key) if direct else None
+    if view is not None:
+        return view
+
+    collection_name, attribute, dtype, width = LAYOUTS[key]
+    collection = getattr(mesh, collection_name)
+    array = np.empty(len(collection) * width, dtype=dtype)
+    collection.foreach_get(attribute, array)
+    return array
+
+
+def write_target(mesh, key, direct=False):
+    view = buffer_view(mesh, key) if direct else None
+    if view is not None:
+        return view, True
+
+    collection_name, _attribute, dtype, width = LAYOUTS[key]
+    return np.empty(len(getattr(mesh, collection_name)) * width, dtype=dtype), False
+
+
+def commit(mesh, key, array, is_view):
+    collection_name, attribute, _dtype, _width = LAYOUTS[key]
+    collection = getattr(mesh, collection_name)
+    if not is_view:
+        collection.foreach_set(attribute, array)
+    elif key == "positions" and len(collection):
+        # Writes through the view bypass RNA; setting one coordinate
+        # tags the positions as changed so normals and bounds refresh.
+        vertex = collection[0]
+        vertex.co = vertex.co
@@ -1,11 +1,17 @@
 import bpy
 import bmesh
-import os
+import time
 from bpy.types import Operator
-from bpy.props import StringProperty, IntProperty
+from bpy.props import StringProperty, IntProperty, FloatProperty, BoolProperty, EnumProperty
 from datetime import datetime
 
+from . import bake
+from . import compare
+from . import mesh_attributes
+from . import properties
+from . import retention
 from . import utils
+from . import writer
 from .addon_preferences import get_preferences
 
 
@@ -30,27 +36,26 @@ class MESH_OT_save_snapshot(Operator):
         prefs = get_preferences()
         
         try:
-            mesh_data = utils.capture_mesh_data(obj)
+            start = time.perf_counter()
+            mesh_data = utils.capture_for_snapshot(obj, prefs)
+            capture_time = time.perf_counter() - start
             
-            storage_dir = prefs.storage_path
-            os.makedirs(storage_dir, exist_ok=True)
+            predecessor = utils.skip_unchanged(context.scene, obj, mesh_data, prefs)
+            if predecessor is not None:
+                self.report({'INFO'}, f"No changes since '{predecessor.name}', snapshot skipped")
+                return {'FINISHED'}
             
-            timestamp = datetime.now()
-            filename = utils.generate_filename(obj.name, timestamp)
-            filepath = os.path.join(storage_dir, filename)
+            snapshot = utils.add_snapshot(context.scene, obj, mesh_data, self.snapshot_name, prefs)
             
-            file_size = utils.save_mesh_to_json(mesh_data, filepath)
+            if utils.skips_attributes(obj, prefs):
+                self.report({'WARNING'},
+                    f"Snapshot '{snapshot.name}' saved without attributes and vertex groups "
+                    f"(mesh above the streaming threshold)")
+                return {'FINISHED'}
             
-            snapshot = context.scene.mesh_snapshots.add()
-            snapshot.name = self.snapshot_name if self.snapshot_name else f"Snapshot {len(context.scene.mesh_snapshots)}"
-            snapshot.filepath = filepath
-            snapshot.timestamp = timestamp.strftime("%Y-%m-%d %H:%M:%S")
-            snapshot.object_name = obj.name
-            snapshot.vertex_count = mesh_data['vertex_count']
-            snapshot.face_count = mesh_data['face_count']
-            snapshot.file_size = file_size
-            
-            self.report({'INFO'}, f"Snapshot '{snapshot.name}' saved")
+            self.report({'INFO'},
+                f"Snapshot '{snapshot.name}' saved "
+                f"(captured in {utils.format_duration(capture_time)})")
             return {'FINISHED'}
             
         except Exception as e:
@@ -58,17 +63,9 @@ class MESH_OT_save_snapshot(Operator):
             return {'CANCELLED'}
     
     def invoke(self, context, event):
-        if context.mode == 'EDIT_MESH':
-            self.report({'ERROR'}, "It's not possible to save a snapshot in Edit Mode.")
-            return {'CANCELLED'}
-
         obj = context.active_object
         if obj:
-            count = sum(
-                1
-                for snap in context.scene.mesh_snapshots
-                if snap.object_name == obj.name
-            )            
+            count = len(properties.object_snapshot_indices(context.scene, obj.name))
             self.snapshot_name = f"{obj.name}_v{count}"
         
         return context.window_manager.invoke_props_dialog(self, width=400)
@@ -85,10 +82,48 @@ class MESH_OT_restore_snapshot(Operator):
     
     index: IntProperty(default=-1)
     
+    mask: EnumProperty(
+        name="Restore",
+        description="Which vertices to restore",
+        items=[
+            ('ALL', "Whole Mesh", "Restore the whole mesh"),
+            ('SELECTED', "Selected Vertices", "Restore the positions of the selected vertices only"),
+            ('GROUP', "Vertex Group", "Restore the positions of a vertex group, weighted by the group weights"),
+        ],
+        default='ALL',
+        options={'SKIP_SAVE'}
+    )
+    
+    vertex_group: StringProperty(
+        name="Vertex Group",
+        description="Vertex group to restore",
+        default="",
+        options={'SKIP_SAVE'}
+    )
+    
+    factor: FloatProperty(
+        name="Factor",
+        description="How far the restored vertices move toward the snapshot",
+        default=1.0,
+        min=0.0,
+        max=1.0,
+        subtype='FACTOR',
+        options={'SKIP_SAVE'}
+    )
+    
     @classmethod
     def poll(cls, context):
         return len(context.scene.mesh_snapshots) > 0
     
+    def draw(self, context):
+        layout = self.layout
+        layout.prop(self, "mask")
+        if self.mask == 'GROUP' and context.active_object is not None:
+            layout.prop_search(self, "vertex_group", context.active_object, "vertex_groups")
+        row = layout.row()
+        row.enabled = self.mask != 'ALL'
+        row.prop(self, "factor", slider=True)
+    
     def execute(self, context):
         snapshots = context.scene.mesh_snapshots
         
@@ -99,16 +134,17 @@ class MESH_OT_restore_snapshot(Operator):
         snapshot = snapshots[self.index]
         
         try:
-            mesh_data = utils.load_mesh_from_json(snapshot.filepath)
+            writer.flush()
+            prefs = get_preferences()
             
             obj = context.active_object
             
             if obj is None or obj.type != 'MESH':
                 self.report({'ERROR'}, 
-                    f"Select the object '{mesh_data['object_name']}'")
+                    f"Select the object '{snapshot.object_name}'")
                 return {'CANCELLED'}
             
-            original_name = mesh_data['object_name']
+            original_name = snapshot.object_name
             current_name = obj.name
             
             if current_name != original_name:
@@ -117,14 +153,26 @@ class MESH_OT_restore_snapshot(Operator):
                     f"Current object: '{current_name}'")
                 return {'CANCELLED'}
             
-            if context.mode != 'OBJECT':
-                bpy.ops.object.mode_set(mode='OBJECT')
+            if self.mask != 'ALL':
+                mesh_data = utils.load_mesh_snapshot(snapshot.filepath)
+                direct = prefs.direct_mesh_access and utils.should_stream(snapshot.raw_size, prefs)
+                count = utils.apply_partial_mesh_data(
+                    obj, mesh_data, self.mask, self.vertex_group, self.factor, direct
+                )
+                self.report({'INFO'},
+                    f"✓ Snapshot '{snapshot.name}' restored on {count} vertices")
+                return {'FINISHED'}
             
-            utils.apply_mesh_data(obj, mesh_data)
+            if utils.should_stream(snapshot.raw_size, prefs):
+                positions_only = utils.stream_mesh_snapshot(obj, snapshot.filepath, prefs)
+            else:
+                mesh_data = utils.load_mesh_snapshot(snapshot.filepath)
+                positions_only = utils.apply_mesh_data(obj, mesh_data, snapshot.filepath)
             
+            mode = "positions only" if positions_only else "full rebuild"
             self.report({'INFO'}, 
                 f"✓ Snapshot '{snapshot.name}' restored "
-                f"({mesh_data['vertex_count']}v, {mesh_data['face_count']}f)")
+                f"({snapshot.vertex_count}v, {snapshot.face_count}f, {mode})")
             return {'FINISHED'}
             
         except FileNotFoundError:
@@ -169,6 +217,171 @@ class MESH_OT_restore_snapshot(Operator):
         
         return self.execute(context)
 
+class MESH_OT_compare_snapshot(Operator):
+    bl_idname = "mesh.compare_snapshot"
+    bl_label = "Compare with Current"
+    bl_description = "Measure how far the vertices moved since this snapshot"
+    bl_options = {'REGISTER', 'UNDO'}
+    
+    index: IntProperty(default=-1)
+    
+    tolerance: FloatProperty(
+        name="Tolerance",
+        description="Vertices that moved less than this count as unchanged",
+        default=0.00001,
+        min=0.0,
+        precision=6,
+        subtype='DISTANCE'
+    )
+    
+    heatmap: BoolProperty(
+        name="Heatmap",
+        description=f"Write the displacement to the '{mesh_attributes.DIFF_ATTRIBUTE}' color attribute",
+        default=False
+    )
+    
+    @classmethod
+    def poll(cls, context):
+        return context.active_object and context.active_object.type == 'MESH'
+    
+    def execute(self, context):
+        snapshots = context.scene.mesh_snapshots
+        
+        if self.index < 0 or self.index >= len(snapshots):
+            self.report({'ERROR'}, "Invalid snapshot")
+            return {'CANCELLED'}
+        
+        snapshot = snapshots[self.index]
+        obj = context.active_object
+        heatmap = self.heatmap
+        if heatmap and obj.mode == 'EDIT':
+            self.report({'WARNING'}, "The heatmap can only be written in Object Mode")
+            heatmap = False
+        
+        try:
+            writer.flush()
+            start = time.perf_counter()
+            stats = compare.compare_snapshot(obj, snapshot, get_preferences(), self.tolerance, heatmap)
+            elapsed = time.perf_counter() - start
+            
+            method = "per vertex" if stats["same_topology"] else "nearest vertex"
+            self.report({'INFO'},
+                f"'{snapshot.name}': {stats['moved']} of {stats['count']} vertices moved, "
+                f"max {stats['max']:.4g}, mean {stats['mean']:.4g}, RMS {stats['rms']:.4g} "
+                f"({method}, {utils.format_duration(elapsed)})")
+            return {'FINISHED'}
+            
+        except FileNotFoundError:
+            self.report({'ERROR'}, "File not Found")
+            return {'CANCELLED'}
+        except Exception as e:
+            self.report({'ERROR'}, f"Error on compare: {str(e)}")
+            return {'CANCELLED'}
+
+
+class MESH_OT_bake_shape_keys(Operator):
+    bl_idname = "mesh.bake_snapshot_shape_keys"
+    bl_label = "Bake to Shape Keys"
+    bl_description = "Turn snapshots of the active object into shape keys, optionally keyframed along the timeline"
+    bl_options = {'REGISTER', 'UNDO'}
+    
+    scope: EnumProperty(
+        name="Snapshots",
+        description="Which snapshots of the active object to bake",
+        items=[
+            ('ALL', "All", "Every snapshot of the active object"),
+            ('ACTIVE', "Active", "Only the snapshot selected in the list"),
+        ],
+        default='ALL'
+    )
+    
+    name_filter: StringProperty(
+        name="Name Contains",
+        description="Only bake snapshots whose name contains this text",
+        default=""
+    )
+    
+    keyframes: BoolProperty(
+        name="Keyframes",
+        description="Animate the keys so that each snapshot is fully shown at its own frame",
+        default=False
+    )
+    
+    frame_start: IntProperty(
+        name="Start Frame",
+        description="Frame of the oldest baked snapshot",
+        default=1
+    )
+    
+    frame_step: IntProperty(
+        name="Frame Step",
+        description="Frames between consecutive snapshots",
+        default=10,
+        min=1
+    )
+    
+    @classmethod
+    def poll(cls, context):
+        obj = context.active_object
+        return obj and obj.type == 'MESH' and context.mode == 'OBJECT'
+    
+    def draw(self, context):
+        layout = self.layout
+        layout.prop(self, "scope")
+        layout.prop(self, "name_filter")
+        layout.prop(self, "keyframes")
+        col = layout.column(align=True)
+        col.enabled = self.keyframes
+        col.prop(self, "frame_start")
+        col.prop(self, "frame_step")
+    
+    def execute(self, context):
+        scene = context.scene
+        obj = context.active_object
+        snapshots = scene.mesh_snapshots
+        
+        try:
+            writer.flush()
+            
+            indices = properties.object_snapshot_indices(scene, obj.name)
+            if self.scope == 'ACTIVE':
+                indices = [i for i in indices if i == scene.mesh_history_active_index]
+            if self.name_filter:
+                pattern = self.name_filter.lower()
+                indices = [i for i in indices if pattern in snapshots[i].name.lower()]
+            
+            selected = [snapshots[i] for i in indices]
+            baked = bake.bakeable(obj, selected)
+            if not baked:
+                self.report({'ERROR'}, "No snapshots with the vertex count of the mesh")
+                return {'CANCELLED'}
+            
+            start = time.perf_counter()
+            keys = bake.bake_shape_keys(
+                obj, baked, get_preferences(),
+                self.keyframes, self.frame_start, self.frame_step
+            )
+            elapsed = time.perf_counter() - start
+            
+            message = f"{len(keys)} shape keys baked in {utils.format_duration(elapsed)}"
+            skipped = len(selected) - len(baked)
+            if skipped:
+                message += f", {skipped} snapshots skipped (different vertex count)"
+            self.report({'INFO'}, message)
+            return {'FINISHED'}
+            
+        except FileNotFoundError:
+            self.report({'ERROR'}, "File not Found")
+            return {'CANCELLED'}
+        except Exception as e:
+            self.report({'ERROR'}, f"Error on bake: {str(e)}")
+            return {'CANCELLED'}
+    
+    def invoke(self, context, event):
+        self.frame_start = context.scene.frame_start
+        return context.window_manager.invoke_props_dialog(self, width=300)
+
+
 class MESH_OT_delete_snapshot(Operator):
     bl_idname = "mesh.delete_snapshot"
     bl_label = "Delete Snapshot"
@@ -187,13 +400,10 @@ class MESH_OT_delete_snapshot(Operator):
         if self.index < 0 or self.index >= len(snapshots):
             return {'CANCELLED'}
         
-        snapshot = snapshots[self.index]
-        
         try:
-            if os.path.exists(snapshot.filepath):
-                os.remove(snapshot.filepath)
-            
-            snapshots.remove(self.index)
+            writer.flush()
+            prefs = get_preferences()
+            utils.remove_snapshot(context.scene, self.index, utils.storage_options(prefs))
             
             self.report({'INFO'}, "Snapshot deleted")
             return {'FINISHED'}
@@ -233,11 +443,12 @@ class MESH_OT_clear_all_snapshots(Operator):
         count = len(snapshots)
         
         try:
+            writer.flush()
             for snapshot in snapshots:
-                if os.path.exists(snapshot.filepath):
-                    os.remove(snapshot.filepath)
+                utils.delete_snapshot_file(snapshot.filepath)
             
             snapshots.clear()
+            properties.invalidate_snapshot_index()
             
             self.report({'INFO'}, f"{count} snapshots deleted ")
             return {'FINISHED'}
@@ -266,11 +477,7 @@ class MESH_clear_object_snapshots(Operator):
         if not obj or obj.type != 'MESH':
             return False
         
-        current_name = obj.name
-        for snapshot in context.scene.mesh_snapshots:
-            if snapshot.object_name == current_name:
-                return True
-        return False
+        return len(properties.object_snapshot_indices(context.scene, obj.name)) > 0
     
     def execute(self, context):
         obj = context.active_object
@@ -281,16 +488,16 @@ class MESH_clear_object_snapshots(Operator):
         snapshots = context.scene.mesh_snapshots
         
         try:
-            indices_to_remove = []
-            for i in range(len(snapshots) - 1, -1, -1):
-                snapshot = snapshots[i]
-                if snapshot.object_name == current_name:
-                    if os.path.exists(snapshot.filepath):
-                        os.remove(snapshot.filepath)
-                    indices_to_remove.append(i)
+            writer.flush()
+            indices_to_remove = list(reversed(
+                properties.object_snapshot_indices(context.scene, current_name)
+            ))
+            for i in indices_to_remove:
+                utils.delete_snapshot_file(snapshots[i].filepath)
             
             for i in indices_to_remove:
                 snapshots.remove(i)
+            properties.invalidate_snapshot_index()
             
             count = len(indices_to_remove)
             self.report({'INFO'}, f"{count} snapshots of '{current_name}' deleted")
@@ -307,7 +514,7 @@ class MESH_clear_object_snapshots(Operator):
         
         current_name = obj.name
         
-        count = sum(1 for s in context.scene.mesh_snapshots if s.object_name == current_name)
+        count = len(properties.object_snapshot_indices(context.scene, current_name))
         
         return context.window_manager.invoke_confirm(
             self,
@@ -316,12 +523,260 @@ class MESH_clear_object_snapshots(Operator):
         )
 
 
+class MESH_OT_clean_up_storage(Operator):
+    bl_idname = "mesh.clean_up_storage"
+    bl_label = "Clean Up Storage"
+    bl_description = "Apply the retention limits, delete orphaned files from the save directory and compact snapshot packs"
+    bl_options = {'REGISTER', 'UNDO'}
+    
+    def execute(self, context):
+        try:
+            expired, orphans, reclaimed = retention.clean_up_storage(get_preferences())
+        except Exception as e:
+            self.report({'ERROR'}, f"Error on clean up: {str(e)}")
+            return {'CANCELLED'}
+        
+        self.report({'INFO'},
+            f"{expired} snapshots expired, {orphans} orphaned files removed, "
+            f"{utils.format_file_size(reclaimed)} reclaimed from packs")
+        return {'FINISHED'}
+    
+    def invoke(self, context, event):
+        return context.window_manager.invoke_confirm(
+            self,
+            event,
+            message="Delete expired snapshots and orphaned files?\nThis action can't be reverted."
+        )
+
+
+class MESH_OT_save_snapshot_set(Operator):
+    bl_idname = "mesh.save_snapshot_set"
+    bl_label = "Save Snapshot Set"
+    bl_description = "Save a snapshot of several meshes at once under one shared set"
+    bl_options = {'REGISTER', 'UNDO'}
+    
+    scope: EnumProperty(
+        name="Objects",
+        description="Which meshes to snapshot",
+        items=[
+            ('SELECTED', "Selected", "All selected mesh objects"),
+            ('ALL', "All Meshes", "Every mesh object in the scene"),
+        ],
+        default='SELECTED'
+    )
+    
+    set_name: StringProperty(
+        name="Set Name",
+        description="Name shared by all snapshots of this set (defaults to the date and time)",
+        default=""
+    )
+    
+    @classmethod
+    def poll(cls, context):
+        return context.mode in {'OBJECT', 'EDIT_MESH'}
+    
+    def execute(self, context):
+        prefs = get_preferences()
+        scene = context.scene
+        
+        source = context.selected_objects if self.scope == 'SELECTED' else scene.objects
+        objects = [obj for obj in source if obj.type == 'MESH']
+        if not objects:
+            self.report({'ERROR'}, "No mesh objects to snapshot")
+            return {'CANCELLED'}
+        
+        set_id = self.set_name or datetime.now().strftime("Set %Y-%m-%d %H:%M:%S")
+        
+        try:
+            start = time.perf_counter()
+            filepaths = []
+            without_layers = 0
+            
+            # Captures run here on the main thread; each one is handed to
+            # the writer pool right away, so encoding of earlier meshes
+            # overlaps with capturing the next ones. Unchanged meshes are
+            # saved too, or restoring the set would leave them out; their
+            # delta against the previous snapshot is next to empty.
+            for obj in objects:
+                mesh_data = utils.capture_for_snapshot(obj, prefs)
+                if utils.skips_attributes(obj, prefs):
+                    without_layers += 1
+                count = len(properties.object_snapshot_indices(scene, obj.name))
+                snapshot = utils.add_snapshot(
+                    scene, obj, mesh_data, f"{obj.name}_v{count}", prefs,
+                    set_id=set_id, background=True
+                )
+                filepaths.append(snapshot.filepath)
+            
+            writer.flush()
+            elapsed = time.perf_counter() - start
+            
+            written = set(filepaths)
+            raw_size = sum(s.raw_size for s in scene.mesh_snapshots if s.filepath in written)
+            rate = raw_size / elapsed if elapsed > 0 else 0
+            
+            message = (
+                f"Set '{set_id}': {len(filepaths)} saved, "
+                f"{utils.format_file_size(raw_size)} in {utils.format_duration(elapsed)} "
+                f"({utils.format_file_size(rate)}/s)"
+            )
+            if without_layers:
+                message += f", {without_layers} above the streaming threshold saved without attributes"
+                self.report({'WARNING'}, message)
+            else:
+                self.report({'INFO'}, message)
+            return {'FINISHED'}
+            
+        except Exception as e:
+            self.report({'ERROR'}, f"Error on save: {str(e)}")
+            return {'CANCELLED'}
+    
+    def invoke(self, context, event):
+        return context.window_manager.invoke_props_dialog(self, width=400)
+
+
+_set_items = []
+
+
+def _snapshot_set_items(self, context):
+    counts = {}
+    for snapshot in context.scene.mesh_snapshots:
+        if snapshot.set_id:
+            counts[snapshot.set_id] = counts.get(snapshot.set_id, 0) + 1
+    
+    # Blender keeps only a weak reference to dynamic enum strings, so the
+    # list has to outlive this call.
+    _set_items[:] = [
+        (set_id, set_id, f"Restore {count} meshes")
+        for set_id, count in reversed(list(counts.items()))
+    ] or [('NONE', "No sets", "")]
+    return _set_items
+
+
+class MESH_OT_restore_snapshot_set(Operator):
+    bl_idname = "mesh.restore_snapshot_set"
+    bl_label = "Restore Snapshot Set"
+    bl_description = "Restore every mesh of a snapshot set in one step"
+    bl_options = {'REGISTER', 'UNDO'}
+    
+    set_id: EnumProperty(
+        name="Set",
+        description="Snapshot set to restore",
+        items=_snapshot_set_items
+    )
+    
+    @classmethod
+    def poll(cls, context):
+        return len(context.scene.mesh_snapshots) > 0
+    
+    def execute(self, context):
+        try:
+            writer.flush()
+            
+            entries = [
+                (snapshot.object_name, snapshot.filepath, snapshot.raw_size)
+                for snapshot in context.scene.mesh_snapshots
+                if snapshot.set_id == self.set_id
+            ]
+            if not entries:
+                self.report({'ERROR'}, "Invalid snapshot set")
+                return {'CANCELLED'}
+            
+            # Huge snapshots are streamed one at a time afterwards instead
+            # of being decoded side by side in memory.
+            prefs = get_preferences()
+            streamed = [entry for entry in entries if utils.should_stream(entry[2], prefs)]
+            entries = [entry for entry in entries if not utils.should_stream(entry[2], prefs)]
+            
+            start = time.perf_counter()
+            loaded = writer.run_parallel(
+                utils.load_mesh_snapshot,
+                [filepath for _, filepath, _ in entries]
+            )
+            
+            restored = 0
+            missing = 0
+            for (object_name, filepath, _), mesh_data in zip(entries, loaded):
+                obj = bpy.data.objects.get(object_name)
+                if obj is None or obj.type != 'MESH':
+                    missing += 1
+                    continue
+                utils.apply_mesh_data(obj, mesh_data, filepath)
+                restored += 1
+            del loaded
+            
+            for object_name, filepath, _ in streamed:
+                obj = bpy.data.objects.get(object_name)
+                if obj is None or obj.type != 'MESH':
+                    missing += 1
+                    continue
+                utils.stream_mesh_snapshot(obj, filepath, prefs)
+                restored += 1
+            
+            elapsed = time.perf_counter() - start
+            message = f"Set '{self.set_id}': {restored} meshes restored in {utils.format_duration(elapsed)}"
+            if missing:
+                message += f", {missing} objects not found"
+            self.report({'INFO'}, message)
+            return {'FINISHED'}
+            
+        except FileNotFoundError:
+            self.report({'ERROR'}, "File not Found")
+            return {'CANCELLED'}
+        except Exception as e:
+            self.report({'ERROR'}, f"Error on restore: {str(e)}")
+            return {'CANCELLED'}
+
+
+class MESH_OT_rescan_storage(Operator):
+    bl_idname = "mesh.rescan_storage"
+    bl_label = "Rescan Storage"
+    bl_description = "Rebuild the snapshot list from the files in the save directory"
+    bl_options = {'REGISTER', 'UNDO'}
+    
+    scope: EnumProperty(
+        name="Snapshots",
+        description="Which snapshots found in the save directory are added to the list",
+        items=[
+            ('SCENE', "Objects in Scene", "Add snapshots of objects in this scene"),
+            ('ALL', "All", "Add every snapshot in the save directory"),
+        ],
+        default='SCENE'
+    )
+    
+    def execute(self, context):
+        prefs = get_preferences()
+        object_names = None
+        if self.scope == 'SCENE':
+            object_names = {obj.name for obj in context.scene.objects if obj.type == 'MESH'}
+        
+        try:
+            start = time.perf_counter()
+            writer.flush()
+            added, relinked = utils.rescan_storage(context.scene, prefs.storage_path, object_names)
+            elapsed = time.perf_counter() - start
+        except Exception as e:
+            self.report({'ERROR'}, f"Error on rescan: {str(e)}")
+            return {'CANCELLED'}
+        
+        self.report({'INFO'},
+            f"{added} snapshots added, {relinked} relinked "
+            f"(in {utils.format_duration(elapsed)})")
+        return {'FINISHED'}
+
+
 classes = (
     MESH_OT_save_snapshot,
     MESH_OT_restore_snapshot,
+    MESH_OT_compare_snapshot,
+    MESH_OT_bake_shape_keys,
     MESH_OT_delete_snapshot,
     MESH_OT_clear_all_snapshots,
-    MESH_clear_object_snapshots
+    MESH_clear_object_snapshots,
+    MESH_OT_clean_up_storage,
+    MESH_OT_rescan_storage,
+    MESH_OT_save_snapshot_set,
+    MESH_OT_restore_snapshot_set,
 )
 
 
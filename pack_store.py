@@ -0,0 +1,356 @@
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+
+
+PACK_EXTENSION = ".mpack"
+INDEX_EXTENSION = ".idx"
+
+# A pack reference looks like a file next to the pack:
+# "<storage>/<pack>.mpack::<snapshot>.msnap". dirname() and basename()
+# keep working on it, so delta parents, the manifest and the chunk store
+# treat packed and loose snapshots alike.
+SEPARATOR = "::"
+
+PACK_MAGIC = b"MPAK"
+PACK_VERSION = 1
+# magic, version, pack id
+PACK_HEADER = struct.Struct("<4sH10x16s")
+
+RECORD_MAGIC = b"MPKR"
+# magic, flags, name length, payload length, commit time, CRC32 of the
+# name and payload
+RECORD = struct.Struct("<4sHHQdI4x")
+TOMBSTONE = 1
+ALIGNMENT = 16
+
+# The index only caches record positions; records committed after it
+# was last saved are recovered by scanning past its end.
+INDEX_SAVE_INTERVAL = 32
+COPY_SIZE = 1024 * 1024
+
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def is_pack_ref(path):
+    return SEPARATOR in os.path.basename(path)
+
+
+def split_ref(path):
+    pack_path, _separator, name = path.rpartition(SEPARATOR)
+    return pack_path, name
+
+
+def make_ref(pack_path, name):
+    return f"{pack_path}{SEPARATOR}{name}"
+
+
+def _record_size(entry):
+    record_start, payload_start, payload_len, _committed = entry
+    return _align(payload_start + payload_len) - record_start
+
+
+class PackFile:
+    def __init__(self, path):
+        self.path = path
+        self.index_path = path + INDEX_EXTENSION
+        self._lock = threading.Lock()
+        # name -> [record start, payload start, payload length, commit time]
+        self._entries = None
+        self._pack_id = None
+        self._end = 0
+        self._dead = 0
+        self._unsaved = 0
+
+    def _load(self):
+        if self._entries is not None:
+            return self._entries
+
+        self._entries = {}
+        self._pack_id = None
+        self._end = 0
+        self._dead = 0
+        self._unsaved = 0
+        try:
+            f = open(self.path, 'rb')
+        except FileNotFoundError:
+            return self._entries
+
+        with f:
+            magic, version, pack_id = PACK_HEADER.unpack(f.read(PACK_HEADER.size))
+            if magic != PACK_MAGIC:
+                raise ValueError(f"Not a snapshot pack: {self.path}")
+            if version > PACK_VERSION:
+                raise ValueError(f"Unsupported pack version {version}")
+
+            self._pack_id = pack_id
+            self._end = PACK_HEADER.size
+            index = self._read_index()
+            if index is not None:
+                self._entries = index["entries"]
+                self._end = index["end"]
+                self._dead = index["dead"]
+            self._scan(f)
+        return self._entries
+
+    def _read_index(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        # An index left over from before a compaction describes another
+        # layout; the pack is rescanned from the start instead.
+        if index.get("pack_id") != self._pack_id.hex():
+            return None
+        return index
+
+    def _scan(self, f):
+        size = os.fstat(f.fileno()).st_size
+        position = self._end
+        while position + RECORD.size <= size:
+            f.seek(position)
+            magic, flags, name_len, payload_len, committed, checksum = RECORD.unpack(
+                f.read(RECORD.size)
+            )
+            payload_start = _align(position + RECORD.size + name_len)
+            end = _align(payload_start + payload_len)
+            if magic != RECORD_MAGIC or not name_len or end > size:
+                break
+
+            name = f.read(name_len)
+            crc = zlib.crc32(name)
+            f.seek(payload_start)
+            remaining = payload_len
+            while remaining:
+                data = f.read(min(remaining, COPY_SIZE))
+                crc = zlib.crc32(data, crc)
+                remaining -= len(data)
+
+            # A record torn by a crash ends the pack; the next commit
+            # overwrites it.
+            if crc != checksum:
+                break
+
+            self._apply(name.decode('utf-8'), flags, [position, payload_start, payload_len, committed])
+            self._unsaved += 1
+            position = end
+        self._end = position
+
+    def _apply(self, name, flags, entry):
+        previous = self._entries.pop(name, None)
+        if previous is not None:
+            self._dead += _record_size(previous)
+        if flags & TOMBSTONE:
+            self._dead += _record_size(entry)
+        else:
+            self._entries[name] = entry
+
+    def _create(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._pack_id = os.urandom(16)
+        with open(self.path, 'wb') as f:
+            f.write(PACK_HEADER.pack(PACK_MAGIC, PACK_VERSION, self._pack_id))
+        self._end = PACK_HEADER.size
+
+    def _commit(self, name, parts, flags=0):
+        self._load()
+        if self._pack_id is None:
+            self._create()
+
+        name_bytes = name.encode('utf-8')
+        committed = time.time()
+        record_start = self._end
+        payload_start = _align(record_start + RECORD.size + len(name_bytes))
+        payload_len = 0
+        crc = zlib.crc32(name_bytes)
+
+        with open(self.path, 'r+b') as f:
+            if os.fstat(f.fileno()).st_size != record_start:
+                f.truncate(record_start)
+            f.seek(record_start)
+            # The record header is written last: until then the record
+            # reads as torn, so a crash mid-write never commits it.
+            f.write(b"\0" * RECORD.size)
+            f.write(name_bytes)
+            f.write(b"\0" * (payload_start - f.tell()))
+            for part in parts:
+                part = memoryview(part).cast('B')
+                f.write(part)
+                crc = zlib.crc32(part, crc)
+                payload_len += len(part)
+            end = _align(payload_start + payload_len)
+            f.write(b"\0" * (end - f.tell()))
+
+            f.seek(record_start)
+            f.write(RECORD.pack(RECORD_MAGIC, flags, len(name_bytes), payload_len, committed, crc))
+
+        self._end = end
+        self._apply(name, flags, [record_start, payload_start, payload_len, committed])
+        self._unsaved += 1
+        if self._unsaved >= INDEX_SAVE_INTERVAL:
+            self._save_index()
+
+    def _save_index(self):
+        index = {
+            "pack_id": self._pack_id.hex(),
+            "end": self._end,
+            "dead": self._dead,
+            "entries": self._entries,
+        }
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f)
+        os.replace(tmp_path, self.index_path)
+        self._unsaved = 0
+
+    def write(self, name, parts):
+        with self._lock:
+            self._commit(name, parts)
+
+    def remove(self, name):
+        with self._lock:
+            if name in self._load():
+                self._commit(name, [], TOMBSTONE)
+
+    def entry(self, name):
+        with self._lock:
+            entry = self._load().get(name)
+            return tuple(entry) if entry is not None else None
+
+    def entries(self):
+        with self._lock:
+            return {name: tuple(entry) for name, entry in self._load().items()}
+
+    def version(self, name):
+        with self._lock:
+            entry = self._load().get(name)
+            if entry is None:
+                return None
+            return self._pack_id.hex(), entry[1]
+
+    def open(self, name):
+        entry = self.entry(name)
+        if entry is None:
+            raise FileNotFoundError(f"File not Found: {make_ref(self.path, name)}")
+
+        with open(self.path, 'rb') as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return buffer, entry[1], entry[2]
+
+    def dead_bytes(self):
+        with self._lock:
+            self._load()
+            return self._dead
+
+    def save_index(self):
+        with self._lock:
+            if self._entries is not None and self._unsaved:
+                self._save_index()
+
+    def compact(self):
+        with self._lock:
+            entries = self._load()
+            if not self._dead:
+                return 0
+
+            pack_id = os.urandom(16)
+            compacted = {}
+            tmp_path = self.path + ".tmp"
+            with open(self.path, 'rb') as source, open(tmp_path, 'wb') as target:
+                target.write(PACK_HEADER.pack(PACK_MAGIC, PACK_VERSION, pack_id))
+                for name, entry in sorted(entries.items(), key=lambda item: item[1][0]):
+                    record_start, payload_start, payload_len, committed = entry
+                    new_start = target.tell()
+                    source.seek(record_start)
+                    remaining = _record_size(entry)
+                    while remaining:
+                        data = source.read(min(remaining, COPY_SIZE))
+                        target.write(data)
+                        remaining -= len(data)
+                    compacted[name] = [
+                        new_start, new_start + payload_start - record_start, payload_len, committed
+                    ]
+                end = target.tell()
+
+            reclaimed = self._end - end
+            os.replace(tmp_path, self.path)
+            self._pack_id = pack_id
+            self._entries = compacted
+            self._end = end
+            self._dead = 0
+            self._save_index()
+            return reclaimed
+
+
+_packs = {}
+_packs_lock = threading.Lock()
+
+
+def get_pack(pack_path):
+    key = os.path.abspath(pack_path)
+    with _packs_lock:
+        pack = _packs.get(key)
+        if pack is None:
+            pack = PackFile(key)
+            _packs[key] = pack
+        return pack
+
+
+def find_packs(storage_dir):
+    try:
+        with os.scandir(storage_dir) as entries:
+            return [
+                get_pack(entry.path) for entry in entries
+                if entry.name.endswith(PACK_EXTENSION) and entry.is_file()
+            ]
+    except FileNotFoundError:
+        return []
+
+
+def exists(path):
+    if not is_pack_ref(path):
+        return os.path.exists(path)
+    pack_path, name = split_ref(path)
+    return os.path.exists(pack_path) and get_pack(pack_path).entry(name) is not None
+
+
+def getsize(path):
+    if not is_pack_ref(path):
+        return os.path.getsize(path)
+    pack_path, name = split_ref(path)
+    entry = get_pack(pack_path).entry(name)
+    if entry is None:
+        raise FileNotFoundError(f"File not Found: {path}")
+    return entry[2]
+
+
+def version(path):
+    if not is_pack_ref(path):
+        try:
+            return os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+    pack_path, name = split_ref(path)
+    return get_pack(pack_path).version(name)
+
+
+def remove(path):
+    if not is_pack_ref(path):
+        os.remove(path)
+        return
+    pack_path, name = split_ref(path)
+    get_pack(pack_path).remove(name)
+
+
+def save_indices():
+    with _packs_lock:
+        packs = list(_packs.values())
+    for pack in packs:
+        pack.save_index()
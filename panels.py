@@ -1,10 +1,75 @@
 import bpy
-from bpy.types import Panel
+from bpy.types import Panel, UIList
 
+from . import cache
+from . import compare
+from . import manifest
+from . import properties
 from . import utils
 from .addon_preferences import get_preferences
 
 
+WRITE_STATE_ICONS = {
+    'PENDING': 'SORTTIME',
+    'WRITTEN': 'CHECKMARK',
+    'FAILED': 'ERROR',
+}
+
+
+class MESH_UL_snapshots(UIList):
+    bl_idname = "MESH_UL_snapshots"
+    
+    def draw_item(self, context, layout, data, item, icon, active_data, active_propname, index):
+        row = layout.row(align=True)
+        row.label(text="", icon=WRITE_STATE_ICONS[item.write_state])
+        row.prop(item, "name", text="", emboss=False, icon='TIME' if item.is_autosave else 'MESH_DATA')
+        
+        restore_op = row.operator(
+            "mesh.restore_snapshot",
+            text="",
+            icon='RECOVER_LAST'
+        )
+        restore_op.index = index
+        
+        op = row.operator(
+            "mesh.compare_snapshot",
+            text="",
+            icon='ARROW_LEFTRIGHT'
+        )
+        op.index = index
+        
+        op = row.operator(
+            "mesh.delete_snapshot",
+            text="",
+            icon='TRASH'
+        )
+        op.index = index
+    
+    def filter_items(self, context, data, propname):
+        snapshots = getattr(data, propname)
+        obj = context.active_object
+        if obj is None or obj.type != 'MESH':
+            return [0] * len(snapshots), []
+        
+        indices = properties.object_snapshot_indices(context.scene, obj.name)
+        if self.filter_name:
+            pattern = self.filter_name.lower()
+            indices = [i for i in indices if pattern in snapshots[i].name.lower()]
+        
+        flags = [0] * len(snapshots)
+        for i in indices:
+            flags[i] = self.bitflag_filter_item
+        
+        order = []
+        if self.use_filter_sort_alpha:
+            by_name = sorted(indices, key=lambda i: snapshots[i].name.lower())
+            order = list(range(len(snapshots)))
+            for position, i in zip(sorted(indices), by_name):
+                order[i] = position
+        
+        return flags, order
+
+
 class MESH_history_panel(Panel):
     bl_label = "Mesh History"
     bl_idname = "MESH_history_panel"
@@ -27,76 +92,44 @@ class MESH_history_panel(Panel):
         current_name = obj.name if obj and obj.type == 'MESH' else None
         
         if current_name:
-            compatible_snapshots = [
-                (i, snap) for i, snap in enumerate(scene.mesh_snapshots)
-                if snap.object_name == current_name
-            ]
+            indices = properties.object_snapshot_indices(scene, current_name)
         else:
-            compatible_snapshots = []
+            indices = []
         
-        if len(compatible_snapshots) > 0:
+        snapshots = scene.mesh_snapshots
+        
+        if len(indices) > 0:
             box = layout.box()
             row = box.row()
-            row.label(text=f"Snapshots of '{current_name}': {len(compatible_snapshots)}", icon='FILE')
+            row.label(text=f"Snapshots of '{current_name}': {len(indices)}", icon='FILE')
             
             if prefs.show_file_size:
-                total_size = sum(snap.file_size for _, snap in compatible_snapshots)
-                row.label(text=utils.format_file_size(total_size))
-        
-        layout.separator()
-        
-        if len(compatible_snapshots) > 0:
-            box = layout.box()
-            box.label(text="Saved Snapshots:", icon='DOCUMENTS')
+                total_size = sum(snapshots[i].file_size for i in indices)
+                total_raw = sum(snapshots[i].raw_size for i in indices)
+                row.label(text=utils.format_stored_size(total_size, total_raw))
+            
+            layout.template_list(
+                "MESH_UL_snapshots", "",
+                scene, "mesh_snapshots",
+                scene, "mesh_history_active_index",
+                rows=prefs.list_rows
+            )
+            
+            if len(indices) > 1:
+                layout.prop(obj, "mesh_history_scrub", slider=True)
+            
+            active_index = scene.mesh_history_active_index
+            if active_index < len(snapshots) and snapshots[active_index].object_name == current_name:
+                self.draw_snapshot_info(layout, prefs, snapshots[active_index])
+                op = layout.operator("mesh.restore_snapshot", icon='RESTRICT_SELECT_OFF', text="Restore Selected Vertices")
+                op.index = active_index
+                op.mask = 'SELECTED'
             
-            for original_index, snapshot in compatible_snapshots:
-                snap_box = box.box()
-                
-                row = snap_box.row(align=True)
-                
-                row.label(text="", icon='CHECKMARK')
-                row.label(text=snapshot.name, icon='MESH_DATA')
-                
-                col = row.column(align=True)
-                col.scale_x = 0.8
-                
-                restore_op = col.operator(
-                    "mesh.restore_snapshot",
-                    text="",
-                    icon='RECOVER_LAST'
-                )
-                restore_op.index = original_index
-                
-                op = col.operator(
-                    "mesh.delete_snapshot",
-                    text="",
-                    icon='TRASH'
-                )
-                op.index = original_index
-                
-                info_col = snap_box.column(align=True)
-                info_col.scale_y = 0.8
-                
-                info_col.label(
-                    text=f"  Timestamp: {snapshot.timestamp}",
-                    icon='TIME'
-                )
-                
-                if prefs.show_vertex_count:
-                    info_col.label(
-                        text=f"  Geometry: {snapshot.vertex_count}v / {snapshot.face_count}f",
-                        icon='EDITMODE_HLT'
-                    )
-                
-                if prefs.show_file_size:
-                    info_col.label(
-                        text=f"  Size: {utils.format_file_size(snapshot.file_size)}",
-                        icon='DISK_DRIVE'
-                    )
+            layout.operator("mesh.bake_snapshot_shape_keys", icon='SHAPEKEY_DATA')
             
-            layout.separator()
-            row = layout.row()
-            if len(compatible_snapshots) > 1:
+            if len(indices) > 1:
+                layout.separator()
+                row = layout.row()
                 row.operator("mesh.clear_object_snapshots", icon='TRASH', text=f"Delete snapshots of '{current_name}'")
         
         elif current_name:
@@ -113,9 +146,9 @@ class MESH_history_panel(Panel):
             col.separator(factor=0.5)
             col.label(text="The snapshots will appear here.")
         
-        total_snapshots = len(scene.mesh_snapshots)
+        total_snapshots = len(snapshots)
 
-        other_count = total_snapshots - len(compatible_snapshots)
+        other_count = total_snapshots - len(indices)
         layout.separator()
         box = layout.box()
         col = box.column(align=True)
@@ -126,6 +159,71 @@ class MESH_history_panel(Panel):
         row = layout.row()
         row.alert = True
         row.operator("mesh.clear_all_snapshots", icon='TRASH', text=f"Delete all snapshots in project ({total_snapshots})")
+    
+    def draw_snapshot_info(self, layout, prefs, snapshot):
+        info_col = layout.box().column(align=True)
+        info_col.scale_y = 0.8
+        
+        info_col.label(
+            text=f"  Timestamp: {snapshot.timestamp}",
+            icon='TIME'
+        )
+        
+        if prefs.show_vertex_count:
+            info_col.label(
+                text=f"  Geometry: {snapshot.vertex_count}v / {snapshot.face_count}f",
+                icon='EDITMODE_HLT'
+            )
+        
+        stats = compare.last_result(snapshot.filepath)
+        if stats is not None:
+            info_col.label(
+                text=f"  Last compare: {stats['moved']}/{stats['count']} moved, max {stats['max']:.3g}",
+                icon='ARROW_LEFTRIGHT'
+            )
+        
+        if snapshot.is_lossy:
+            info_col.label(
+                text=f"  Quantized: within {snapshot.error_bound:.3g} units",
+                icon='MOD_DECIM'
+            )
+        
+        if snapshot.write_state == 'PENDING':
+            info_col.label(text="  Writing to disk...", icon='DISK_DRIVE')
+        elif snapshot.write_state == 'FAILED':
+            info_col.label(text="  Write failed", icon='ERROR')
+        elif prefs.show_file_size:
+            kind = " (delta)" if snapshot.parent_filepath else ""
+            info_col.label(
+                text=f"  Size: {utils.format_stored_size(snapshot.file_size, snapshot.raw_size)}{kind}",
+                icon='DISK_DRIVE'
+            )
+
+
+class MESH_history_sets(Panel):
+    bl_label = "Snapshot Sets"
+    bl_idname = "MESH_history_sets"
+    bl_space_type = 'VIEW_3D'
+    bl_region_type = 'UI'
+    bl_category = 'Mesh History'
+    bl_parent_id = "MESH_history_panel"
+    bl_options = {'DEFAULT_CLOSED'}
+    
+    def draw(self, context):
+        layout = self.layout
+        
+        col = layout.column(align=True)
+        op = col.operator("mesh.save_snapshot_set", icon='ADD', text="Save Selected Meshes")
+        op.scope = 'SELECTED'
+        op = col.operator("mesh.save_snapshot_set", icon='ADD', text="Save All Meshes")
+        op.scope = 'ALL'
+        
+        layout.operator_menu_enum(
+            "mesh.restore_snapshot_set",
+            "set_id",
+            text="Restore Set",
+            icon='RECOVER_LAST'
+        )
 
 
 class MESH_history_info(Panel):
@@ -159,13 +257,31 @@ class MESH_history_info(Panel):
         col = box.column(align=True)
         col.scale_y = 0.8
         
-        storage_dir = utils.get_storage_directory()
+        storage_dir = get_preferences().storage_path
         col.label(text="Files saved in:")
         col.label(text=f"  {storage_dir}")
+        
+        file_count, stored_size = manifest.get_manifest(storage_dir).stats()
+        col.label(text=f"  {file_count} files, {utils.format_file_size(stored_size)}")
+        
+        snapshot_cache = cache.snapshot_cache
+        col.separator(factor=0.5)
+        col.label(
+            text=f"Cache: {len(snapshot_cache)} snapshots, "
+                 f"{utils.format_file_size(snapshot_cache.size)} / "
+                 f"{utils.format_file_size(snapshot_cache.budget)}"
+        )
+        col.label(text=f"  Hits: {snapshot_cache.hits}  Misses: {snapshot_cache.misses}")
+        
+        row = layout.row(align=True)
+        row.operator("mesh.rescan_storage", icon='FILE_REFRESH')
+        row.operator("mesh.clean_up_storage", icon='BRUSH_DATA')
 
 
 classes = (
+    MESH_UL_snapshots,
     MESH_history_panel,
+    MESH_history_sets,
     MESH_history_info,
 )
 
@@ -1,8 +1,55 @@
 import bpy
-from bpy.props import StringProperty, IntProperty, CollectionProperty
+from bpy.app.handlers import persistent
+from bpy.props import StringProperty, IntProperty, FloatProperty, BoolProperty, EnumProperty, CollectionProperty
 from bpy.types import PropertyGroup
 
 
+# scene pointer -> (snapshot count, {object name: [collection indices]})
+_snapshot_index = {}
+
+
+def invalidate_snapshot_index(*args):
+    _snapshot_index.clear()
+
+
+def _get_snapshot_index(scene):
+    snapshots = scene.mesh_snapshots
+    key = scene.as_pointer()
+    entry = _snapshot_index.get(key)
+
+    # The count check catches additions and removals that bypass the
+    # operators, e.g. from scripts; renames invalidate through the
+    # object_name update callback.
+    if entry is None or entry[0] != len(snapshots):
+        index = {}
+        for i, snapshot in enumerate(snapshots):
+            index.setdefault(snapshot.object_name, []).append(i)
+        entry = (len(snapshots), index)
+        _snapshot_index[key] = entry
+
+    return entry[1]
+
+
+def object_snapshot_indices(scene, object_name):
+    return _get_snapshot_index(scene).get(object_name, [])
+
+
+def indexed_object_names(scene):
+    return list(_get_snapshot_index(scene))
+
+
+@persistent
+def _invalidate_on_change(*args):
+    invalidate_snapshot_index()
+
+
+INDEX_HANDLERS = (
+    bpy.app.handlers.load_post,
+    bpy.app.handlers.undo_post,
+    bpy.app.handlers.redo_post,
+)
+
+
 class MeshSnapshot(PropertyGroup):    
     name: StringProperty(
         name="Name",
@@ -12,7 +59,7 @@ class MeshSnapshot(PropertyGroup):
     
     filepath: StringProperty(
         name="Path",
-        description="Path for JSON file",
+        description="Path for snapshot file",
         default=""
     )
     
@@ -25,6 +72,19 @@ class MeshSnapshot(PropertyGroup):
     object_name: StringProperty(
         name="Object",
         description="Name opf the object of the original mesh",
+        default="",
+        update=invalidate_snapshot_index
+    )
+    
+    is_autosave: BoolProperty(
+        name="Autosave",
+        description="Snapshot was taken automatically by the autosave timer",
+        default=False
+    )
+    
+    set_id: StringProperty(
+        name="Set",
+        description="Identifier shared by snapshots saved together in one batch",
         default=""
     )
     
@@ -42,16 +102,82 @@ class MeshSnapshot(PropertyGroup):
         min=0
     )
     
+    topology_hash: StringProperty(
+        name="Topology Hash",
+        description="Fingerprint of the edge, loop and face arrays",
+        default=""
+    )
+    
+    positions_hash: StringProperty(
+        name="Positions Hash",
+        description="Fingerprint of the vertex positions",
+        default=""
+    )
+    
+    attributes_hash: StringProperty(
+        name="Attributes Hash",
+        description="Fingerprint of the attribute layers and vertex group weights",
+        default=""
+    )
+    
+    parent_filepath: StringProperty(
+        name="Parent",
+        description="Snapshot this delta snapshot is based on (empty for full snapshots)",
+        default=""
+    )
+    
+    chain_depth: IntProperty(
+        name="Chain Depth",
+        description="Number of delta snapshots between this one and its full snapshot",
+        default=0,
+        min=0
+    )
+    
+    write_state: EnumProperty(
+        name="Write State",
+        description="Whether the snapshot file has been written to disk",
+        items=[
+            ('PENDING', "Pending", "Waiting to be written in the background"),
+            ('WRITTEN', "Written", "Stored on disk"),
+            ('FAILED', "Failed", "Writing the snapshot file failed"),
+        ],
+        default='WRITTEN'
+    )
+    
+    is_lossy: BoolProperty(
+        name="Lossy",
+        description="Vertex positions were stored quantized and may differ slightly from the mesh",
+        default=False
+    )
+    
+    error_bound: FloatProperty(
+        name="Error Bound",
+        description="Largest distance a restored vertex can be from where it was when saved",
+        default=0.0,
+        min=0.0,
+        subtype='DISTANCE'
+    )
+    
     file_size: IntProperty(
         name="Size",
         description="File Size",
         default=0,
         min=0
     )
+    
+    raw_size: IntProperty(
+        name="Raw Size",
+        description="Size of the written data before compression",
+        default=0,
+        min=0
+    )
 
 def register():
     bpy.utils.register_class(MeshSnapshot)
     
+    for handlers in INDEX_HANDLERS:
+        handlers.append(_invalidate_on_change)
+    
     bpy.types.Scene.mesh_snapshots = CollectionProperty(
         type=MeshSnapshot,
         name="Mesh Snapshots",
@@ -65,6 +191,11 @@ def register():
     )
 
 def unregister():
+    for handlers in INDEX_HANDLERS:
+        if _invalidate_on_change in handlers:
+            handlers.remove(_invalidate_on_change)
+    invalidate_snapshot_index()
+    
     del bpy.types.Scene.mesh_history_active_index
     del bpy.types.Scene.mesh_snapshots
     
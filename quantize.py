@@ -0,0 +1,86 @@
+import numpy as np
+
+
+def _zigzag(values):
+    # Signed deltas to unsigned: 0, -1, 1, -2, ... -> 0, 1, 2, 3, ...
+    return ((values << 1) ^ (values >> 63)).astype(np.uint64)
+
+
+def _unzigzag(values):
+    values = values.astype(np.int64)
+    return (values >> 1) ^ -(values & 1)
+
+
+def _pack(codes, width):
+    # As many width-bit codes as fit go into each 64-bit word, so 21-bit
+    # codes take 8 bytes per three instead of a uint32 each.
+    per_word = 64 // width
+    padded = np.zeros(-(-len(codes) // per_word) * per_word, dtype=np.uint64)
+    padded[:len(codes)] = codes
+    shifts = np.arange(per_word, dtype=np.uint64) * np.uint64(width)
+    return np.bitwise_or.reduce(padded.reshape(-1, per_word) << shifts, axis=1)
+
+
+def _unpack(words, width, count):
+    per_word = 64 // width
+    shifts = np.arange(per_word, dtype=np.uint64) * np.uint64(width)
+    mask = np.uint64((1 << width) - 1)
+    codes = (np.asarray(words, dtype=np.uint64)[:, None] >> shifts) & mask
+    return codes.ravel()[:count]
+
+
+def quantize_positions(positions, bits):
+    vectors = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+    if len(vectors):
+        origin = vectors.min(axis=0)
+        extent = vectors.max(axis=0) - origin
+    else:
+        origin = extent = np.zeros(3)
+
+    step = extent / ((1 << bits) - 1)
+    grid = np.rint((vectors - origin) / np.where(step > 0, step, 1.0)).astype(np.int64)
+
+    # One axis after the other, each delta coded along the vertex order:
+    # neighbouring vertices are usually close, so most deltas are small
+    # and the compressor sees long runs of zero bytes. Deltas wrap around
+    # the grid size, so every code fits in the chosen number of bits.
+    half = 1 << (bits - 1)
+    deltas = (np.diff(grid.T, axis=1, prepend=0) + half) % (1 << bits) - half
+
+    # Rounding to the grid moves each coordinate by at most half a step,
+    # and storing the result as float32 by at most half a float32 ulp.
+    magnitude = np.maximum(np.abs(origin), np.abs(origin + extent)).astype(np.float32)
+    error = 0.5 * step + 0.5 * np.spacing(magnitude).astype(np.float64)
+    # Packed at the width of the largest code, which is at most bits.
+    codes = _zigzag(deltas.ravel())
+    width = max(int(codes.max()).bit_length(), 1) if len(codes) else 1
+    info = {
+        "bits": bits,
+        "width": width,
+        "count": len(codes),
+        "origin": origin.tolist(),
+        "step": step.tolist(),
+        "error_bound": float(np.linalg.norm(error)),
+    }
+    return _pack(codes, width), info
+
+
+def dequantize_positions(coded, info):
+    if "width" in info:
+        coded = _unpack(coded, info["width"], info["count"])
+    deltas = _unzigzag(np.asarray(coded)).reshape(3, -1)
+    grid = np.cumsum(deltas, axis=1) % (1 << info["bits"])
+    vectors = grid.T * np.array(info["step"]) + np.array(info["origin"])
+    return vectors.astype(np.float32).ravel()
+
+
+def quantize_mesh_data(mesh_data, bits, max_error=0.0):
+    coded, info = quantize_positions(mesh_data["positions"], bits)
+    if max_error and info["error_bound"] > max_error:
+        return mesh_data
+
+    payload = dict(mesh_data)
+    payload["positions"] = coded
+    payload["quantization"] = {"positions": info}
+    payload["error_bound"] = info["error_bound"]
+    return payload
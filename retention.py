@@ -0,0 +1,290 @@
+import bpy
+import os
+import time
+from bpy.app.handlers import persistent
+from datetime import datetime, timedelta
+
+from . import chunk_store
+from . import pack_store
+from . import properties
+from . import snapshot_format
+from . import utils
+from . import writer
+from .cache import snapshot_cache
+from .addon_preferences import get_preferences
+
+
+MEGABYTE = 1024 * 1024
+IDLE_INTERVAL = 10.0
+SWEEP_INTERVAL = 0.1
+# Seconds of orphan sweeping done per timer tick, so a huge storage
+# directory never stalls the UI.
+SWEEP_SLICE = 0.005
+
+KEEP_ALL_AGE = timedelta(hours=1)
+KEEP_HOURLY_AGE = timedelta(days=1)
+
+_state = {"sweep": None, "last_pass": None}
+
+
+def _parse_timestamp(timestamp):
+    try:
+        return datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        return None
+
+
+def select_expired(snapshots, indices, prefs, now=None):
+    if now is None:
+        now = datetime.now()
+
+    # indices are oldest first; the newest snapshot always survives.
+    kept = list(indices)
+
+    if prefs.retention_thinning:
+        buckets = set()
+        thinned = []
+        for i in reversed(kept):
+            timestamp = _parse_timestamp(snapshots[i].timestamp)
+            age = now - timestamp if timestamp is not None else timedelta(0)
+            if age > KEEP_HOURLY_AGE:
+                bucket = ('DAY', timestamp.date())
+            elif age > KEEP_ALL_AGE:
+                bucket = ('HOUR', timestamp.replace(minute=0, second=0))
+            else:
+                bucket = None
+
+            if bucket is not None:
+                if bucket in buckets:
+                    continue
+                buckets.add(bucket)
+            thinned.append(i)
+        kept = thinned[::-1]
+
+    if prefs.retention_max_count > 0:
+        kept = kept[-prefs.retention_max_count:]
+
+    if prefs.retention_max_mb > 0:
+        limit = prefs.retention_max_mb * MEGABYTE
+        total = sum(snapshots[i].file_size for i in kept)
+        while len(kept) > 1 and total > limit:
+            total -= snapshots[kept.pop(0)].file_size
+
+    kept = set(kept)
+    return [
+        i for i in indices
+        if i not in kept and snapshots[i].write_state != 'PENDING'
+    ]
+
+
+def apply_retention(scene, prefs, now=None):
+    snapshots = scene.mesh_snapshots
+    expired = []
+    for object_name in properties.indexed_object_names(scene):
+        indices = properties.object_snapshot_indices(scene, object_name)
+        expired.extend(select_expired(snapshots, indices, prefs, now))
+
+    # Newest first: a delta whose parent also expires is already gone by
+    # the time the parent is removed, so it is never promoted for nothing.
+    options = utils.storage_options(prefs)
+    for index in sorted(expired, reverse=True):
+        utils.remove_snapshot(scene, index, options)
+    return len(expired)
+
+
+def referenced_paths():
+    paths = set()
+    for scene in bpy.data.scenes:
+        for snapshot in scene.mesh_snapshots:
+            paths.add(os.path.abspath(snapshot.filepath))
+    return paths
+
+
+# A generator so the timer can spread the work across ticks: it yields
+# after every file it looks at and returns the number of files removed.
+def sweep_orphans(storage_dir, referenced, min_age):
+    storage_dir = os.path.abspath(storage_dir)
+    if not os.path.isdir(storage_dir):
+        return 0
+
+    cutoff = time.time() - min_age
+    removed = 0
+
+    # Delta parents are only recorded inside the files that use them.
+    keep = set(referenced)
+    pending = [path for path in keep if os.path.dirname(path) == storage_dir]
+    while pending:
+        path = pending.pop()
+        yield
+        try:
+            parent = snapshot_format.read_snapshot_metadata(path).get("parent")
+        except (OSError, ValueError):
+            continue
+        if parent:
+            parent = os.path.join(storage_dir, parent)
+            if parent not in keep:
+                keep.add(parent)
+                pending.append(parent)
+
+    with os.scandir(storage_dir) as entries:
+        entries = [entry for entry in entries if entry.is_file()]
+
+    for entry in entries:
+        yield
+        path = entry.path
+        if path in keep or writer.is_pending(path):
+            continue
+        try:
+            if entry.stat().st_mtime > cutoff:
+                continue
+            if entry.name.endswith(".tmp"):
+                os.remove(path)
+            elif entry.name.endswith(snapshot_format.FILE_EXTENSION):
+                utils.delete_snapshot_file(path)
+            else:
+                continue
+        except OSError as e:
+            print(f"Mesh History: Could not remove '{path}': {e}")
+            continue
+        removed += 1
+
+    for pack in pack_store.find_packs(storage_dir):
+        for name, entry in pack.entries().items():
+            yield
+            path = pack_store.make_ref(pack.path, name)
+            if path in keep or writer.is_pending(path) or entry[3] > cutoff:
+                continue
+            try:
+                utils.delete_snapshot_file(path)
+            except (OSError, ValueError) as e:
+                print(f"Mesh History: Could not remove '{path}': {e}")
+                continue
+            removed += 1
+
+    # Chunks nothing counts a reference to are left over from crashed or
+    # interrupted writes; the age check keeps chunks of in-flight writes.
+    store = chunk_store.get_store(storage_dir)
+    if not os.path.isdir(store.root):
+        return removed
+
+    with os.scandir(store.root) as entries:
+        folders = [entry.path for entry in entries if entry.is_dir()]
+
+    for folder in folders:
+        with os.scandir(folder) as entries:
+            chunks = [entry for entry in entries if entry.is_file()]
+        for entry in chunks:
+            yield
+            try:
+                if store.remove_orphan(entry.name, cutoff):
+                    removed += 1
+            except OSError:
+                continue
+
+    return removed
+
+
+def run_sweep(sweep, deadline=None):
+    try:
+        while deadline is None or time.perf_counter() < deadline:
+            next(sweep)
+    except StopIteration as stop:
+        return stop.value or 0
+    return None
+
+
+def clean_up_storage(prefs):
+    writer.flush()
+    expired = sum(apply_retention(scene, prefs) for scene in bpy.data.scenes)
+    orphans = 0
+    if prefs.orphan_min_age_days > 0:
+        orphans = run_sweep(sweep_orphans(
+            prefs.storage_path, referenced_paths(), prefs.orphan_min_age_days * 86400
+        ))
+
+    # Nothing is queued after the flush above, so packs can be rewritten
+    # without racing a writer.
+    reclaimed = 0
+    snapshot_cache.close_files()
+    for pack in pack_store.find_packs(prefs.storage_path):
+        reclaimed += pack.compact()
+
+    utils.tag_redraw()
+    return expired, orphans, reclaimed
+
+
+@persistent
+def _reset_on_load(*args):
+    # The running sweep only knows the references of the previous file.
+    _state["sweep"] = None
+
+
+def _start_pass(prefs):
+    # Promoting dependents reads their files, so wait for queued writes.
+    if writer.pending_paths():
+        return
+
+    expired = 0
+    for scene in bpy.data.scenes:
+        expired += apply_retention(scene, prefs)
+    if expired:
+        utils.tag_redraw()
+
+    _state["last_pass"] = time.monotonic()
+    if prefs.orphan_min_age_days > 0:
+        _state["sweep"] = sweep_orphans(
+            prefs.storage_path, referenced_paths(), prefs.orphan_min_age_days * 86400
+        )
+
+
+def _tick():
+    try:
+        prefs = get_preferences()
+    except KeyError:
+        return IDLE_INTERVAL
+
+    if not prefs.retention_enabled:
+        _state["sweep"] = None
+        return IDLE_INTERVAL
+
+    if _state["sweep"] is None:
+        last_pass = _state["last_pass"]
+        interval = prefs.retention_interval * 60.0
+        if last_pass is not None and time.monotonic() - last_pass < interval:
+            return min(interval - (time.monotonic() - last_pass), IDLE_INTERVAL)
+        try:
+            _start_pass(prefs)
+        except Exception as e:
+            print(f"Mesh History: Retention pass failed: {e}")
+            _state["last_pass"] = time.monotonic()
+
+    sweep = _state["sweep"]
+    if sweep is None:
+        return IDLE_INTERVAL
+
+    try:
+        removed = run_sweep(sweep, time.perf_counter() + SWEEP_SLICE)
+    except Exception as e:
+        print(f"Mesh History: Orphan sweep failed: {e}")
+        removed = 0
+    if removed is None:
+        return SWEEP_INTERVAL
+
+    _state["sweep"] = None
+    if removed:
+        print(f"Mesh History: Removed {removed} orphaned files")
+    return IDLE_INTERVAL
+
+
+def register():
+    bpy.app.handlers.load_post.append(_reset_on_load)
+    bpy.app.timers.register(_tick, first_interval=IDLE_INTERVAL, persistent=True)
+
+
+def unregister():
+    if bpy.app.timers.is_registered(_tick):
+        bpy.app.timers.unregister(_tick)
+    if _reset_on_load in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(_reset_on_load)
+    _state["sweep"] = None
+    _state["last_pass"] = None
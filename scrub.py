@@ -0,0 +1,154 @@
+import bpy
+import math
+from bpy.app.handlers import persistent
+from bpy.props import FloatProperty
+
+import numpy as np
+
+from . import mesh_buffers
+from . import properties
+from . import utils
+from . import writer
+from .addon_preferences import get_preferences
+
+
+_prefetching = set()
+
+
+def scrub_history(scene, obj):
+    snapshots = scene.mesh_snapshots
+    return [
+        i for i in properties.object_snapshot_indices(scene, obj.name)
+        if snapshots[i].write_state == 'WRITTEN'
+    ]
+
+
+def scrub_position(history, factor):
+    # Oldest snapshot at 0, newest at 1; returns the two neighbouring
+    # history entries and the blend between them.
+    scaled = min(max(factor, 0.0), 1.0) * (len(history) - 1)
+    lower = min(int(math.floor(scaled)), len(history) - 1)
+    upper = min(lower + 1, len(history) - 1)
+    return lower, upper, scaled - lower
+
+
+def _prefetch(filepath):
+    try:
+        utils.load_mesh_snapshot(filepath)
+    except Exception as e:
+        print(f"Mesh History: Prefetching '{filepath}' failed: {e}")
+    finally:
+        _prefetching.discard(filepath)
+
+
+def _prefetch_neighbours(snapshots, history, lower, upper, count):
+    # Decoded positions land in the snapshot cache, so the next steps in
+    # either direction are served from memory.
+    for i in range(max(lower - count, 0), min(upper + count, len(history) - 1) + 1):
+        filepath = snapshots[history[i]].filepath
+        if filepath in _prefetching or snapshots[history[i]].raw_size == 0:
+            continue
+        _prefetching.add(filepath)
+        writer.run_async(_prefetch, filepath)
+
+
+def scrub_to(scene, obj, factor):
+    history = scrub_history(scene, obj)
+    if not history:
+        return
+
+    prefs = get_preferences()
+    snapshots = scene.mesh_snapshots
+    lower, upper, blend = scrub_position(history, factor)
+    first = snapshots[history[lower]]
+    second = snapshots[history[upper]]
+    if not prefs.scrub_interpolate or upper == lower:
+        second = first if blend < 0.5 or upper == lower else second
+        first, blend = second, 0.0
+
+    utils.leave_paint_modes(obj)
+    utils.sync_edit_mesh(obj)
+    mesh = obj.data
+    topology = utils.live_topology_hash(mesh)
+    if first.topology_hash != topology or (blend and second.topology_hash != topology):
+        # Different connectivity: jump to the nearest snapshot with a full
+        # restore, which also brings back its attribute layers.
+        nearest = first if blend < 0.5 else second
+        utils.apply_mesh_data(obj, utils.load_mesh_snapshot(nearest.filepath), nearest.filepath)
+        utils.forget_live_topology(mesh)
+        _prefetch_neighbours(snapshots, history, lower, upper, prefs.scrub_prefetch)
+        return
+
+    start = np.asarray(utils.load_mesh_snapshot(first.filepath)["positions"])
+    if blend:
+        end = np.asarray(utils.load_mesh_snapshot(second.filepath)["positions"])
+
+    if obj.mode == 'EDIT':
+        positions = start + (end - start) * np.float32(blend) if blend else start
+        utils.apply_mesh_data(obj, {
+            "positions": positions,
+            "vertex_count": first.vertex_count,
+            "face_count": first.face_count,
+            "edge_count": len(mesh.edges),
+            "loop_count": len(mesh.loops),
+            "topology_hash": first.topology_hash,
+        })
+    else:
+        # Large meshes are written straight into the mesh memory, without
+        # an intermediate array, like the other restore paths.
+        direct = prefs.direct_mesh_access and utils.should_stream(first.raw_size, prefs)
+        positions, is_view = mesh_buffers.write_target(mesh, "positions", direct)
+        if blend:
+            np.subtract(end, start, out=positions)
+            positions *= np.float32(blend)
+            positions += start
+        else:
+            positions[:] = start
+        mesh_buffers.commit(mesh, "positions", positions, is_view)
+        mesh.update()
+    utils.mark_moved(mesh)
+
+    _prefetch_neighbours(snapshots, history, lower, upper, prefs.scrub_prefetch)
+
+
+def _on_scrub(self, context):
+    try:
+        scrub_to(context.scene, self, self.mesh_history_scrub)
+    except Exception as e:
+        print(f"Mesh History: Scrubbing failed: {e}")
+
+
+@persistent
+def _on_depsgraph_update(scene, depsgraph):
+    utils.forget_changed_topology(depsgraph)
+
+
+@persistent
+def _reset_on_load(*args):
+    utils.forget_live_topology()
+
+
+def register():
+    bpy.types.Object.mesh_history_scrub = FloatProperty(
+        name="History",
+        description="Move through the snapshots of this object, from the oldest to the newest",
+        default=1.0,
+        min=0.0,
+        max=1.0,
+        subtype='FACTOR',
+        options=set(),
+        update=_on_scrub
+    )
+    bpy.app.handlers.depsgraph_update_post.append(_on_depsgraph_update)
+    bpy.app.handlers.load_post.append(_reset_on_load)
+    bpy.app.handlers.undo_post.append(_reset_on_load)
+
+
+def unregister():
+    if _on_depsgraph_update in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.remove(_on_depsgraph_update)
+    for handlers in (bpy.app.handlers.load_post, bpy.app.handlers.undo_post):
+        if _reset_on_load in handlers:
+            handlers.remove(_reset_on_load)
+    utils.forget_live_topology()
+    del bpy.types.Object.mesh_history_scrub
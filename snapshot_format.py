@@ -0,0 +1,372 @@
+import json
+import mmap
+import os
+import struct
+import zlib
+from collections.abc import Mapping
+
+import numpy as np
+
+from . import chunk_store
+from . import compression
+from . import pack_store
+from . import quantize
+
+
+MAGIC = b"MSNP"
+FORMAT_VERSION = 3
+# Version 3 only marks files with quantized positions, which older readers
+# would load as coordinates; all other files keep version 2 so that those
+# readers still accept them.
+PLAIN_VERSION = 2
+FILE_EXTENSION = ".msnap"
+
+# magic, format version, flags, metadata length, metadata CRC32
+HEADER = struct.Struct("<4sHHII")
+HEADER_V1 = struct.Struct("<4sHHI")
+PREFIX = struct.Struct("<4sH")
+# metadata length, metadata CRC32; ends streamed snapshots, whose
+# metadata follows the blocks
+FOOTER = struct.Struct("<II")
+FLAG_TRAILING_METADATA = 1
+ALIGNMENT = 16
+
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _little_endian(array):
+    array = np.ascontiguousarray(array)
+    return array.astype(array.dtype.newbyteorder('<'), copy=False)
+
+
+def is_snapshot_file(filepath):
+    if pack_store.is_pack_ref(filepath):
+        return True
+    with open(filepath, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def _version(mesh_data):
+    return FORMAT_VERSION if "quantization" in mesh_data else PLAIN_VERSION
+
+
+def encode_snapshot(mesh_data, store=None, codec=None, level=6):
+    metadata = {}
+    parts = []
+    blocks = {}
+    offset = 0
+    written = 0
+    raw_written = 0
+
+    for key, value in mesh_data.items():
+        if isinstance(value, np.ndarray):
+            array = _little_endian(value.ravel())
+            block = {
+                "dtype": array.dtype.str,
+                "count": int(array.size),
+            }
+            if codec is not None:
+                block["codec"] = codec
+            blocks[key] = block
+
+            if store is not None and array.nbytes >= chunk_store.MIN_CHUNK_BYTES:
+                digest, chunk_bytes, raw_bytes = store.put(array, codec, level)
+                written += chunk_bytes
+                raw_written += raw_bytes
+                block["chunk"] = digest
+                continue
+
+            if codec is not None:
+                encoded = compression.encode(array.data, codec, level)
+            else:
+                encoded = [array.data]
+
+            offset = _align(offset)
+            block["offset"] = offset
+            block["nbytes"] = sum(len(memoryview(part).cast('B')) for part in encoded)
+            parts.append((offset, block["nbytes"], encoded))
+            offset += block["nbytes"]
+            raw_written += array.nbytes
+        else:
+            metadata[key] = value
+
+    metadata["blocks"] = blocks
+    meta_bytes = json.dumps(metadata, ensure_ascii=False).encode('utf-8')
+    data_start = _align(HEADER.size + len(meta_bytes))
+
+    header = HEADER.pack(MAGIC, _version(mesh_data), 0, len(meta_bytes), zlib.crc32(meta_bytes))
+    output = [header, meta_bytes]
+    position = len(header) + len(meta_bytes)
+    for block_offset, nbytes, encoded in parts:
+        output.append(b"\0" * (data_start + block_offset - position))
+        output.extend(encoded)
+        position = data_start + block_offset + nbytes
+
+    # The file itself, chunk bytes written for it, and the header plus
+    # the uncompressed array bytes.
+    return output, written, data_start + raw_written
+
+
+def stream_snapshot(mesh_data, stats, store=None, codec=None, level=6, chunk_size=None):
+    # Yields the file piece by piece straight from the source arrays: the
+    # metadata goes last, once compressed sizes are known, so at most
+    # chunk_size bytes of encoded output are held at a time.
+    yield HEADER.pack(MAGIC, _version(mesh_data), FLAG_TRAILING_METADATA, 0, 0)
+
+    metadata = {}
+    blocks = {}
+    position = 0
+    written = 0
+    raw_written = 0
+
+    for key, value in mesh_data.items():
+        if not isinstance(value, np.ndarray):
+            metadata[key] = value
+            continue
+
+        array = _little_endian(value.ravel())
+        block = {
+            "dtype": array.dtype.str,
+            "count": int(array.size),
+        }
+        if codec is not None:
+            block["codec"] = codec
+        blocks[key] = block
+
+        if store is not None and array.nbytes >= chunk_store.MIN_CHUNK_BYTES:
+            digest, chunk_bytes, raw_bytes = store.put(array, codec, level, chunk_size)
+            written += chunk_bytes
+            raw_written += raw_bytes
+            block["chunk"] = digest
+            continue
+
+        padding = _align(position) - position
+        if padding:
+            yield b"\0" * padding
+        position += padding
+        block["offset"] = position
+
+        if codec is not None:
+            frames = []
+            for packed, raw_size in compression.encode_frames(array.data, codec, level, chunk_size):
+                frames.append((len(packed), raw_size))
+                yield packed
+            block["frames"] = frames
+            block["nbytes"] = sum(packed_size for packed_size, _raw_size in frames)
+        else:
+            data = memoryview(array.data).cast('B')
+            for start in range(0, len(data), chunk_size):
+                yield data[start:start + chunk_size]
+            block["nbytes"] = len(data)
+
+        position += block["nbytes"]
+        raw_written += array.nbytes
+
+    metadata["blocks"] = blocks
+    meta_bytes = json.dumps(metadata, ensure_ascii=False).encode('utf-8')
+    yield meta_bytes
+    yield FOOTER.pack(len(meta_bytes), zlib.crc32(meta_bytes))
+
+    stats["written"] = written
+    stats["raw_size"] = HEADER.size + len(meta_bytes) + FOOTER.size + raw_written
+
+
+def write_snapshot(filepath, mesh_data, store=None, codec=None, level=6, chunk_size=None):
+    if chunk_size:
+        stats = {}
+        output = stream_snapshot(mesh_data, stats, store, codec, level, chunk_size)
+    else:
+        output, written, raw_size = encode_snapshot(mesh_data, store, codec, level)
+
+    if pack_store.is_pack_ref(filepath):
+        pack_path, name = pack_store.split_ref(filepath)
+        pack_store.get_pack(pack_path).write(name, output)
+    else:
+        tmp_path = filepath + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            for part in output:
+                f.write(part)
+        os.replace(tmp_path, filepath)
+
+    if chunk_size:
+        written, raw_size = stats["written"], stats["raw_size"]
+    return pack_store.getsize(filepath) + written, raw_size
+
+
+def _parse_header(buffer, filepath):
+    magic, version = PREFIX.unpack_from(buffer, 0)
+    if magic != MAGIC:
+        raise ValueError(f"Not a mesh snapshot file: {filepath}")
+    if version > FORMAT_VERSION:
+        raise ValueError(f"Unsupported snapshot format version {version}")
+
+    if version == 1:
+        _magic, _version, flags, meta_len = HEADER_V1.unpack_from(buffer, 0)
+        return HEADER_V1.size, flags, meta_len, None
+
+    _magic, _version, flags, meta_len, checksum = HEADER.unpack_from(buffer, 0)
+    return HEADER.size, flags, meta_len, checksum
+
+
+def _parse_metadata(meta_bytes, checksum, filepath):
+    if checksum is not None and zlib.crc32(meta_bytes) != checksum:
+        raise ValueError(f"Snapshot header is corrupt: {filepath}")
+    return json.loads(bytes(meta_bytes).decode('utf-8'))
+
+
+def _map_snapshot(filepath):
+    if pack_store.is_pack_ref(filepath):
+        pack_path, name = pack_store.split_ref(filepath)
+        return pack_store.get_pack(pack_path).open(name)
+
+    with open(filepath, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return buffer, 0, len(buffer)
+
+
+def _load_metadata(buffer, base, size, filepath):
+    header_size, flags, meta_len, checksum = _parse_header(buffer[base:base + HEADER.size], filepath)
+    if flags & FLAG_TRAILING_METADATA:
+        footer_start = base + size - FOOTER.size
+        meta_len, checksum = FOOTER.unpack(buffer[footer_start:footer_start + FOOTER.size])
+        meta_start = footer_start - meta_len
+        data_start = base + _align(header_size)
+    else:
+        meta_start = base + header_size
+        data_start = base + _align(header_size + meta_len)
+
+    metadata = _parse_metadata(buffer[meta_start:meta_start + meta_len], checksum, filepath)
+    return metadata, data_start
+
+
+def _read_raw_metadata(filepath):
+    buffer, base, size = _map_snapshot(filepath)
+    with buffer:
+        return _load_metadata(buffer, base, size, filepath)[0]
+
+
+def read_snapshot_metadata(filepath):
+    metadata = _read_raw_metadata(filepath)
+    metadata.pop("blocks")
+    return metadata
+
+
+def read_snapshot_summary(filepath):
+    metadata = _read_raw_metadata(filepath)
+    blocks = metadata.pop("blocks")
+    metadata["file_size"] = pack_store.getsize(filepath)
+    metadata["raw_size"] = sum(
+        np.dtype(block["dtype"]).itemsize * block["count"]
+        for block in blocks.values()
+    )
+    return metadata
+
+
+def read_chunk_refs(filepath):
+    blocks = _read_raw_metadata(filepath)["blocks"]
+    return [block["chunk"] for block in blocks.values() if "chunk" in block]
+
+
+class SnapshotFile(Mapping):
+    def __init__(self, filepath):
+        self.filepath = filepath
+
+        self._mmap, base, size = _map_snapshot(filepath)
+
+        self.metadata, self._data_start = _load_metadata(self._mmap, base, size, filepath)
+        self.blocks = self.metadata.pop("blocks")
+        self.quantization = self.metadata.pop("quantization", {})
+        self._arrays = {}
+        self._chunk_maps = []
+
+    def __getitem__(self, key):
+        block = self.blocks.get(key)
+        if block is None:
+            return self.metadata[key]
+
+        array = self._arrays.get(key)
+        if array is None:
+            codec = block.get("codec")
+            if "chunk" in block:
+                store = chunk_store.get_store(os.path.dirname(self.filepath))
+                array, buffer = store.open(block["chunk"], block["dtype"], block["count"], codec)
+                if buffer is not None:
+                    self._chunk_maps.append(buffer)
+            elif codec is not None:
+                start = self._data_start + block["offset"]
+                with memoryview(self._mmap) as view:
+                    array = compression.decode(
+                        view[start:start + block["nbytes"]],
+                        codec,
+                        block["dtype"],
+                        block["count"],
+                        block.get("frames")
+                    )
+            else:
+                array = np.frombuffer(
+                    self._mmap,
+                    dtype=np.dtype(block["dtype"]),
+                    count=block["count"],
+                    offset=self._data_start + block["offset"]
+                )
+            if key in self.quantization:
+                array = quantize.dequantize_positions(array, self.quantization[key])
+            self._arrays[key] = array
+        return array
+
+    def read_into(self, key, out, chunk_size):
+        if key in self.quantization:
+            # Quantized arrays are a fraction of the size; decoding them
+            # whole keeps the delta coding simple.
+            out[:] = self[key]
+            return
+
+        block = self.blocks[key]
+        raw = out.view(np.uint8)
+        if len(raw) != np.dtype(block["dtype"]).itemsize * block["count"]:
+            raise ValueError(f"Stored '{key}' does not fit the mesh")
+
+        codec = block.get("codec")
+        if "chunk" in block:
+            store = chunk_store.get_store(os.path.dirname(self.filepath))
+            store.read_into(block["chunk"], raw, codec, chunk_size)
+            return
+
+        start = self._data_start + block["offset"]
+        if codec is not None:
+            with memoryview(self._mmap) as view:
+                compression.decode_into(
+                    view[start:start + block["nbytes"]], codec, raw, block.get("frames")
+                )
+        else:
+            compression.copy_into(self._mmap, start, raw, chunk_size)
+
+    def __iter__(self):
+        yield from self.metadata
+        yield from self.blocks
+
+    def __len__(self):
+        return len(self.metadata) + len(self.blocks)
+
+    def close(self):
+        self._arrays.clear()
+        for buffer in [self._mmap] + self._chunk_maps:
+            try:
+                buffer.close()
+            except BufferError:
+                # Views handed out are still alive; the map is released
+                # once the last of them is collected.
+                pass
+        self._chunk_maps.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_snapshot(filepath):
+    return SnapshotFile(filepath)
@@ -1,12 +1,37 @@
+import hashlib
 import json
 import os
 import tempfile
-import bmesh
 import bpy
+import bmesh
+import numpy as np
 from datetime import datetime
 
+from . import chunk_store
+from . import manifest
+from . import mesh_attributes
+from . import mesh_buffers
+from . import pack_store
+from . import properties
+from . import quantize
+from . import writer
+from .cache import SnapshotView, snapshot_cache
+from . import snapshot_format
+
 
 DEFAULT_STORAGE_DIR = os.path.join(tempfile.gettempdir(), "blender_mesh_history")
+MEGABYTE = 1024 * 1024
+# Share of moved vertices above which an Edit Mode restore reloads the
+# whole BMesh instead of assigning vertex by vertex
+EDIT_MESH_BULK_FRACTION = 0.05
+
+# (mesh pointer, element counts) -> topology hash of the live mesh.
+# Scrubbing and partial restores only move vertices, so the hash is
+# computed once and kept until some other change updates the geometry
+# of the mesh.
+_live_topology = {}
+# Meshes moved by those since the last depsgraph update
+_moved = set()
 
 
 def get_storage_directory():
@@ -23,7 +48,25 @@ def generate_filename(object_name, timestamp=None):
     safe_name = "".join(c for c in object_name if c.isalnum() or c in "._- ")
     safe_name = safe_name[:50]
     
-    return f"{safe_name}_{time_str}.json"
+    return f"{safe_name}_{time_str}{snapshot_format.FILE_EXTENSION}"
+
+
+def unique_filepath(directory, filename, reserved=()):
+    base, ext = os.path.splitext(filename)
+    filepath = os.path.join(directory, filename)
+    suffix = 1
+    while pack_store.exists(filepath) or filepath in reserved:
+        filepath = os.path.join(directory, f"{base}_{suffix}{ext}")
+        suffix += 1
+    return filepath
+
+
+def pack_filename(obj, prefs):
+    if prefs.pack_scope == 'OBJECT':
+        name = obj.name
+    else:
+        name = os.path.splitext(os.path.basename(bpy.data.filepath))[0] or "untitled"
+    return sanitize_filename(name) + pack_store.PACK_EXTENSION
 
 
 def format_file_size(size_bytes):
@@ -34,37 +77,690 @@ def format_file_size(size_bytes):
     return f"{size_bytes:.1f} TB"
 
 
-def capture_mesh_data(obj):
+def format_stored_size(file_size, raw_size):
+    if raw_size > file_size:
+        return f"{format_file_size(file_size)} ({format_file_size(raw_size)} raw)"
+    return format_file_size(file_size)
+
+
+def format_duration(seconds):
+    if seconds < 1.0:
+        return f"{seconds * 1000.0:.1f} ms"
+    return f"{seconds:.2f} s"
+
+
+def _read_topology(mesh, direct=False):
+    return (
+        mesh_buffers.read(mesh, "edges", direct),
+        mesh_buffers.read(mesh, "loops", direct),
+        mesh_buffers.read(mesh, "loop_starts", direct),
+    )
+
+
+def estimate_mesh_size(mesh):
+    return (
+        len(mesh.vertices) * 12
+        + len(mesh.edges) * 8
+        + len(mesh.loops) * 4
+        + len(mesh.polygons) * 8
+    )
+
+
+def should_stream(size, prefs):
+    return prefs.stream_threshold_mb > 0 and size >= prefs.stream_threshold_mb * MEGABYTE
+
+
+def capture_for_snapshot(obj, prefs):
+    stream = should_stream(estimate_mesh_size(obj.data), prefs)
+    # Attribute layers are copied whole through foreach_get, which would
+    # break the bounded memory of a streamed save; those keep positions
+    # and topology only.
+    return capture_mesh_data(obj, prefs.direct_mesh_access and stream, prefs.capture_attributes and not stream)
+
+
+def skips_attributes(obj, prefs):
+    return (
+        prefs.capture_attributes
+        and should_stream(estimate_mesh_size(obj.data), prefs)
+        and mesh_attributes.has_layers(obj)
+    )
+
+
+def sync_edit_mesh(obj):
+    # In Edit Mode the geometry lives in a BMesh and obj.data lags behind.
+    # Copying it over one way is much cheaper than leaving Edit Mode,
+    # which converts the whole mesh twice.
+    if obj.mode == 'EDIT':
+        obj.update_from_editmode()
+
+
+def leave_paint_modes(obj):
+    # Sculpt (dyntopo in particular) and the paint modes keep their own
+    # copy of the geometry and write it back on exit, which would undo a
+    # restore into obj.data. Edit Mode is written through BMesh instead.
+    if obj.mode not in {'OBJECT', 'EDIT'}:
+        with bpy.context.temp_override(active_object=obj, object=obj):
+            bpy.ops.object.mode_set(mode='OBJECT')
+
+
+def capture_mesh_data(obj, direct=False, attributes=False):
     if obj.type != 'MESH':
         raise ValueError("Object is not a mesh")
 
+    sync_edit_mesh(obj)
     mesh = obj.data
     mesh.update()
-    bm = bmesh.new()
-    bm.from_mesh(mesh)
-    
-    vertex = [[v.co.x, v.co.y, v.co.z] for v in bm.verts]
-    edges = [[e.verts[0].index, e.verts[1].index] for e in bm.edges]
-    faces = [[v.index for v in f.verts] for f in bm.faces]
-    
-    bm.free()
-    
-    return {
+
+    vertex_count = len(mesh.vertices)
+    face_count = len(mesh.polygons)
+
+    # With direct set, the arrays may be views of the mesh itself and are
+    # only valid until the mesh changes.
+    positions = mesh_buffers.read(mesh, "positions", direct)
+    edges, loops, loop_starts = _read_topology(mesh, direct)
+
+    mesh_data = {
         "object_name": obj.name,
         "timestamp": datetime.now().isoformat(),
-        "vertex": vertex,
+        "topology_hash": topology_hash(edges, loops, loop_starts),
+        "positions_hash": positions_hash(positions),
+        "positions": positions,
+        "edges": edges,
+        "loops": loops,
+        "loop_starts": loop_starts,
+        "vertex_count": vertex_count,
+        "edge_count": len(edges) // 2,
+        "loop_count": len(loops),
+        "face_count": face_count,
+    }
+
+    if not direct:
+        # Implied by loop_starts; direct captures skip the extra copy.
+        loop_totals = np.empty(face_count, dtype=np.int32)
+        mesh.polygons.foreach_get("loop_total", loop_totals)
+        mesh_data["loop_totals"] = loop_totals
+
+    if attributes:
+        mesh_attributes.capture(obj, mesh_data)
+
+    return mesh_data
+
+
+def topology_hash(edges, loops, loop_starts):
+    digest = hashlib.blake2b(digest_size=16)
+    for array in (edges, loops, loop_starts):
+        digest.update(len(array).to_bytes(8, 'little'))
+        digest.update(np.ascontiguousarray(array, dtype='<i4'))
+    return digest.hexdigest()
+
+
+def _mesh_counts(mesh):
+    return len(mesh.vertices), len(mesh.edges), len(mesh.loops), len(mesh.polygons)
+
+
+def live_topology_hash(mesh, direct=False):
+    key = (mesh.as_pointer(),) + _mesh_counts(mesh)
+    digest = _live_topology.get(key)
+    if digest is None:
+        forget_live_topology(mesh)
+        digest = topology_hash(*_read_topology(mesh, direct))
+        _live_topology[key] = digest
+    return digest
+
+
+def mark_moved(mesh):
+    # The coming depsgraph update of mesh only moved vertices.
+    _moved.add(mesh.as_pointer())
+
+
+def forget_live_topology(mesh=None):
+    if mesh is None:
+        _live_topology.clear()
+        _moved.clear()
+        return
+    pointer = mesh.as_pointer()
+    for key in [key for key in _live_topology if key[0] == pointer]:
+        del _live_topology[key]
+
+
+def forget_changed_topology(depsgraph):
+    # Any geometry update not caused by moving vertices may have changed
+    # the connectivity, even with the element counts unchanged.
+    if _live_topology:
+        for update in depsgraph.updates:
+            if not update.is_updated_geometry:
+                continue
+            data = update.id.original
+            if isinstance(data, bpy.types.Object):
+                data = data.data
+            if isinstance(data, bpy.types.Mesh) and data.as_pointer() not in _moved:
+                forget_live_topology(data)
+    _moved.clear()
+
+
+def positions_hash(positions):
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(np.ascontiguousarray(positions, dtype='<f4'))
+    return digest.hexdigest()
+
+
+def mesh_matches_snapshot(obj, snapshot, direct=False):
+    mesh = obj.data
+    if not snapshot.positions_hash:
+        return False
+    if len(mesh.vertices) != snapshot.vertex_count or len(mesh.polygons) != snapshot.face_count:
+        return False
+
+    positions = mesh_buffers.read(mesh, "positions", direct)
+    if positions_hash(positions) != snapshot.positions_hash:
+        return False
+    return not snapshot.attributes_hash or mesh_attributes.attributes_hash(obj) == snapshot.attributes_hash
+
+
+def is_unchanged(snapshot, mesh_data):
+    return (
+        bool(snapshot.positions_hash)
+        and snapshot.topology_hash == mesh_data["topology_hash"]
+        and snapshot.positions_hash == mesh_data["positions_hash"]
+        and snapshot.attributes_hash == mesh_data.get("attributes_hash", "")
+    )
+
+
+MESH_ARRAYS = {
+    "positions": np.float32,
+    "edges": np.int32,
+    "loops": np.int32,
+    "loop_starts": np.int32,
+    "loop_totals": np.int32,
+}
+
+
+def normalize_mesh_data(data):
+    if "positions" not in data:
+        return _convert_legacy_mesh_data(data)
+
+    for key, dtype in MESH_ARRAYS.items():
+        data[key] = np.asarray(data[key], dtype=dtype).ravel()
+    return data
+
+
+def _convert_legacy_mesh_data(data):
+    faces = data.get("faces", [])
+    loop_totals = np.fromiter((len(f) for f in faces), dtype=np.int32, count=len(faces))
+    loop_starts = np.zeros(len(faces), dtype=np.int32)
+    if len(faces) > 1:
+        np.cumsum(loop_totals[:-1], out=loop_starts[1:])
+
+    loops = np.fromiter(
+        (i for f in faces for i in f),
+        dtype=np.int32,
+        count=int(loop_totals.sum())
+    )
+
+    positions = np.asarray(data.get("vertex", []), dtype=np.float32).ravel()
+    edges = np.asarray(data.get("edges", []), dtype=np.int32).ravel()
+
+    return {
+        "object_name": data.get("object_name", ""),
+        "timestamp": data.get("timestamp", ""),
+        "positions": positions,
         "edges": edges,
-        "faces": faces,
-        "vertex_count": len(vertex),
+        "loops": loops,
+        "loop_starts": loop_starts,
+        "loop_totals": loop_totals,
+        "vertex_count": len(positions) // 3,
+        "edge_count": len(edges) // 2,
+        "loop_count": len(loops),
         "face_count": len(faces),
     }
 
 
-def save_mesh_to_json(mesh_data, filepath):
-    with open(filepath, 'w', encoding='utf-8') as f:
-        json.dump(mesh_data, f, indent=2, ensure_ascii=False)
-    
-    return os.path.getsize(filepath)
+def _chunk_refs(filepath):
+    if pack_store.exists(filepath) and snapshot_format.is_snapshot_file(filepath):
+        return snapshot_format.read_chunk_refs(filepath)
+    return []
+
+
+def storage_options(prefs):
+    codec = prefs.compression_codec
+    return {
+        "deduplicate": prefs.use_chunk_store,
+        "codec": None if codec == 'NONE' else codec.lower(),
+        "level": prefs.compression_level,
+        "cache": prefs.cache_new_snapshots,
+    }
+
+
+def save_mesh_snapshot(mesh_data, filepath, options=None):
+    options = options or {}
+    store = chunk_store.get_store(os.path.dirname(filepath))
+    previous_refs = _chunk_refs(filepath)
+
+    store.begin_write()
+    try:
+        sizes = snapshot_format.write_snapshot(
+            filepath,
+            mesh_data,
+            store if options.get("deduplicate") else None,
+            options.get("codec"),
+            options.get("level", 6),
+            options.get("stream_chunk")
+        )
+        store.add_refs(_chunk_refs(filepath))
+    finally:
+        store.end_write()
+    store.release(previous_refs)
+
+    manifest.get_manifest(os.path.dirname(filepath)).record(
+        os.path.basename(filepath), manifest.summarize(mesh_data, *sizes)
+    )
+    return sizes
+
+
+def delete_snapshot_file(filepath):
+    if not pack_store.exists(filepath):
+        return
+
+    refs = _chunk_refs(filepath)
+    snapshot_cache.invalidate(filepath)
+    pack_store.remove(filepath)
+    chunk_store.get_store(os.path.dirname(filepath)).release(refs)
+    manifest.get_manifest(os.path.dirname(filepath)).remove(os.path.basename(filepath))
+
+
+def _read_mesh_file(filepath):
+    if not pack_store.exists(filepath):
+        raise FileNotFoundError(f"File not Found: {filepath}")
+
+    if snapshot_format.is_snapshot_file(filepath):
+        return snapshot_format.read_snapshot(filepath)
+
+    return load_mesh_from_json(filepath)
+
+
+def _parent_path(filepath, mesh_data):
+    return os.path.join(os.path.dirname(filepath), mesh_data["parent"])
+
+
+def load_mesh_snapshot(filepath):
+    cached = snapshot_cache.get(filepath)
+    if cached is not None:
+        return cached
+    return snapshot_cache.put(filepath, _resolve_mesh_snapshot(filepath))
+
+
+def _without_layers(mesh_data, resolved=None):
+    # Attribute layers are read on demand by load_snapshot_layers(), so a
+    # restore that only needs positions never decodes them.
+    return SnapshotView(mesh_data, resolved, mesh_attributes.is_layer_key)
+
+
+def load_snapshot_layers(filepath, keys=None):
+    # Each layer comes from the newest file of the delta chain storing it;
+    # deltas only store the layers that changed.
+    if not pack_store.exists(filepath):
+        raise FileNotFoundError(f"File not Found: {filepath}")
+    if not snapshot_format.is_snapshot_file(filepath):
+        return {}
+
+    chain = _open_snapshot_chain(filepath)
+    try:
+        wanted = set(mesh_attributes.layer_keys(chain[0].metadata) if keys is None else keys)
+        layers = {}
+        for snapshot in chain:
+            for key in wanted.intersection(snapshot.blocks).difference(layers):
+                layers[key] = np.array(snapshot[key])
+    finally:
+        for snapshot in chain:
+            snapshot.close()
+    return layers
+
+
+def load_full_mesh_snapshot(filepath):
+    mesh_data = dict(load_mesh_snapshot(filepath))
+    mesh_data.update(load_snapshot_layers(filepath))
+    return mesh_data
+
+
+def _resolve_mesh_snapshot(filepath):
+    data = _read_mesh_file(filepath)
+    if "parent" not in data:
+        return _without_layers(data)
+
+    chain = [data]
+    visited = {os.path.abspath(filepath)}
+    while "parent" in data:
+        filepath = _parent_path(filepath, data)
+        if os.path.abspath(filepath) in visited:
+            raise ValueError(f"Snapshot delta chain loops back to {filepath}")
+        visited.add(os.path.abspath(filepath))
+        data = _read_mesh_file(filepath)
+        chain.append(data)
+
+    keyframe = chain.pop()
+    positions = np.array(keyframe["positions"], dtype=np.float32)
+    vectors = positions.reshape(-1, 3)
+    for delta in reversed(chain):
+        vectors[delta["delta_indices"]] += delta["delta_positions"].reshape(-1, 3)
+
+    resolved = dict(chain[0].metadata)
+    del resolved["parent"]
+    resolved["positions"] = positions
+
+    for delta in chain:
+        delta.close()
+
+    return _without_layers(keyframe, resolved)
+
+
+def make_delta_snapshot(mesh_data, parent_filepath, options=None):
+    if not pack_store.exists(parent_filepath):
+        return None
+
+    parent = load_mesh_snapshot(parent_filepath)
+    if parent.get("topology_hash") != mesh_data["topology_hash"]:
+        return None
+    if parent["vertex_count"] != mesh_data["vertex_count"]:
+        return None
+
+    positions = mesh_data["positions"].reshape(-1, 3)
+    parent_positions = np.asarray(parent["positions"]).reshape(-1, 3)
+
+    # A lossy parent is off by up to its error bound everywhere. With
+    # quantization still on, vertices within that bound count as unchanged
+    # and the delta inherits the bound.
+    options = options or {}
+    tolerance = parent.get("error_bound", 0.0) if options.get("quantize_bits") else 0.0
+    if options.get("max_error") and tolerance > options["max_error"]:
+        tolerance = 0.0
+
+    if tolerance:
+        distances = np.einsum('ij,ij->i', positions - parent_positions, positions - parent_positions)
+        changed = np.flatnonzero(distances > tolerance * tolerance)
+    else:
+        changed = np.flatnonzero(np.any(positions != parent_positions, axis=1))
+
+    # Deltas are taken against the parent as it resolves from disk, so
+    # float rounding does not accumulate along the chain.
+    deltas = positions[changed] - parent_positions[changed]
+
+    delta_data = {
+        key: value for key, value in mesh_data.items()
+        if not isinstance(value, np.ndarray)
+    }
+    delta_data["parent"] = os.path.basename(parent_filepath)
+    if tolerance:
+        delta_data["error_bound"] = tolerance
+    delta_data["delta_indices"] = changed.astype(np.int32)
+    delta_data["delta_positions"] = deltas.ravel()
+    for key in mesh_attributes.changed_keys(mesh_data, parent):
+        delta_data[key] = mesh_data[key]
+    return delta_data
+
+
+def remove_snapshot(scene, index, options=None):
+    snapshots = scene.mesh_snapshots
+    filepath = snapshots[index].filepath
+
+    promote_dependent_snapshots(snapshots, filepath, options)
+    delete_snapshot_file(filepath)
+
+    snapshots.remove(index)
+    properties.invalidate_snapshot_index()
+
+    if scene.mesh_history_active_index >= len(snapshots):
+        scene.mesh_history_active_index = max(len(snapshots) - 1, 0)
+
+
+def find_latest_snapshot(scene, object_name):
+    indices = properties.object_snapshot_indices(scene, object_name)
+    if not indices:
+        return None
+    return scene.mesh_snapshots[indices[-1]]
+
+
+def skip_unchanged(scene, obj, mesh_data, prefs):
+    if prefs.unchanged_save_action == 'SAVE':
+        return None
+
+    predecessor = find_latest_snapshot(scene, obj.name)
+    if predecessor is None or not is_unchanged(predecessor, mesh_data):
+        return None
+
+    if prefs.unchanged_save_action == 'TOUCH':
+        predecessor.timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    return predecessor
+
+
+def add_snapshot(scene, obj, mesh_data, name, prefs, set_id="", background=None, is_autosave=False,
+                 stream=None):
+    if background is None:
+        background = prefs.background_writes
+
+    name = name if name else f"Snapshot {len(scene.mesh_snapshots) + 1}"
+    # Stored in the file header too, so a rescan can rebuild the entry.
+    mesh_data = dict(mesh_data, name=name, set_id=set_id, is_autosave=is_autosave)
+
+    storage_dir = prefs.storage_path
+    os.makedirs(storage_dir, exist_ok=True)
+
+    timestamp = datetime.now()
+    filename = generate_filename(obj.name, timestamp)
+    if prefs.use_pack_store:
+        filename = pack_store.make_ref(pack_filename(obj, prefs), filename)
+    filepath = unique_filepath(storage_dir, filename, writer.pending_paths())
+
+    options = storage_options(prefs)
+    if stream is None:
+        stream = should_stream(estimate_mesh_size(obj.data), prefs)
+    if stream:
+        # Written in place from the capture, which may be a view of the
+        # mesh itself: no delta against a parent that would have to be
+        # resolved in full, no cached copy and no queued write.
+        options["stream_chunk"] = prefs.stream_chunk_mb * MEGABYTE
+        options["cache"] = False
+        background = False
+    elif prefs.position_quantization != 'NONE' and (is_autosave or not prefs.quantize_autosaves_only):
+        options["quantize_bits"] = int(prefs.position_quantization)
+        options["max_error"] = prefs.quantization_max_error
+
+    parent_filepath = ""
+    chain_depth = 0
+
+    predecessor = find_latest_snapshot(scene, obj.name)
+    if (prefs.use_delta_snapshots and not stream and predecessor is not None
+            and predecessor.write_state != 'FAILED'
+            and predecessor.topology_hash in ("", mesh_data["topology_hash"])
+            and predecessor.chain_depth + 1 < prefs.keyframe_interval):
+        parent_filepath = predecessor.filepath
+        chain_depth = predecessor.chain_depth + 1
+
+    if background:
+        writer.submit(
+            filepath,
+            write_mesh_snapshot,
+            mesh_data, filepath, parent_filepath, options,
+            depends_on=parent_filepath
+        )
+        write_state = 'PENDING'
+        file_size = 0
+        raw_size = 0
+        error_bound = 0.0
+    else:
+        result = write_mesh_snapshot(mesh_data, filepath, parent_filepath, options)
+        write_state = 'WRITTEN'
+        file_size = result["file_size"]
+        raw_size = result["raw_size"]
+        error_bound = result["error_bound"]
+        if not result["parent_filepath"]:
+            parent_filepath = ""
+            chain_depth = 0
+
+    snapshot = scene.mesh_snapshots.add()
+    snapshot.name = name
+    snapshot.filepath = filepath
+    snapshot.timestamp = timestamp.strftime("%Y-%m-%d %H:%M:%S")
+    snapshot.object_name = obj.name
+    snapshot.is_autosave = is_autosave
+    snapshot.set_id = set_id
+    snapshot.vertex_count = mesh_data['vertex_count']
+    snapshot.face_count = mesh_data['face_count']
+    snapshot.topology_hash = mesh_data['topology_hash']
+    snapshot.positions_hash = mesh_data['positions_hash']
+    snapshot.attributes_hash = mesh_data.get('attributes_hash', "")
+    snapshot.file_size = file_size
+    snapshot.raw_size = raw_size
+    snapshot.is_lossy = error_bound > 0.0
+    snapshot.error_bound = error_bound
+    snapshot.parent_filepath = parent_filepath
+    snapshot.chain_depth = chain_depth
+    snapshot.write_state = write_state
+    return snapshot
+
+
+def promote_dependent_snapshots(snapshots, filepath, options=None):
+    for snapshot in snapshots:
+        if snapshot.parent_filepath != filepath:
+            continue
+
+        mesh_data = load_full_mesh_snapshot(snapshot.filepath)
+        snapshot.file_size, snapshot.raw_size = save_mesh_snapshot(
+            mesh_data, snapshot.filepath, options
+        )
+        snapshot.parent_filepath = ""
+        del mesh_data
+
+    update_chain_depths(snapshots)
+
+
+def update_chain_depths(snapshots):
+    by_path = {}
+    for snapshot in snapshots:
+        parent = by_path.get(snapshot.parent_filepath)
+        if not snapshot.parent_filepath:
+            snapshot.chain_depth = 0
+        elif parent is not None:
+            snapshot.chain_depth = parent.chain_depth + 1
+        by_path[snapshot.filepath] = snapshot
+
+
+def _entry_from_summary(storage_dir, filename, summary):
+    timestamp = summary.get("timestamp", "")
+    try:
+        timestamp = datetime.fromisoformat(timestamp).strftime("%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        pass
+
+    parent = summary.get("parent")
+    return {
+        "name": summary.get("name") or os.path.splitext(filename)[0],
+        "filepath": os.path.join(storage_dir, filename),
+        "timestamp": timestamp,
+        "object_name": summary.get("object_name", ""),
+        "is_autosave": summary.get("is_autosave", False),
+        "set_id": summary.get("set_id", ""),
+        "vertex_count": summary.get("vertex_count", 0),
+        "face_count": summary.get("face_count", 0),
+        "topology_hash": summary.get("topology_hash", ""),
+        "positions_hash": summary.get("positions_hash", ""),
+        "attributes_hash": summary.get("attributes_hash", ""),
+        "parent_filepath": os.path.join(storage_dir, parent) if parent else "",
+        "file_size": summary.get("file_size", 0),
+        "raw_size": summary.get("raw_size", 0),
+        "is_lossy": summary.get("error_bound", 0.0) > 0.0,
+        "error_bound": summary.get("error_bound", 0.0),
+    }
+
+
+def rescan_storage(scene, storage_dir, object_names=None):
+    storage_dir = os.path.abspath(storage_dir)
+    summaries = manifest.get_manifest(storage_dir).refresh()
+    snapshots = scene.mesh_snapshots
+    fields = list(properties.MeshSnapshot.__annotations__)
+
+    entries = []
+    known = set()
+    relinked = 0
+    for snapshot in snapshots:
+        entry = {field: getattr(snapshot, field) for field in fields}
+        filename = os.path.basename(entry["filepath"])
+        known.add(filename)
+
+        # Files that moved with the save directory are found again by name.
+        if not pack_store.exists(entry["filepath"]) and filename in summaries:
+            entry["filepath"] = os.path.join(storage_dir, filename)
+            relinked += 1
+        parent = os.path.basename(entry["parent_filepath"])
+        if parent and not pack_store.exists(entry["parent_filepath"]) and parent in summaries:
+            entry["parent_filepath"] = os.path.join(storage_dir, parent)
+        entries.append(entry)
+
+    added = 0
+    for filename, summary in sorted(summaries.items()):
+        if filename in known:
+            continue
+        if object_names is not None and summary.get("object_name") not in object_names:
+            continue
+        entries.append(_entry_from_summary(storage_dir, filename, summary))
+        added += 1
+
+    if not added and not relinked:
+        return 0, 0
+
+    # The collection is kept oldest first; parents always sort before
+    # their deltas.
+    entries.sort(key=lambda entry: entry["timestamp"])
+    snapshots.clear()
+    for entry in entries:
+        snapshot = snapshots.add()
+        for field, value in entry.items():
+            setattr(snapshot, field, value)
+
+    properties.invalidate_snapshot_index()
+    update_chain_depths(snapshots)
+    if scene.mesh_history_active_index >= len(snapshots):
+        scene.mesh_history_active_index = max(len(snapshots) - 1, 0)
+    return added, relinked
+
+
+def write_mesh_snapshot(mesh_data, filepath, parent_filepath="", options=None):
+    options = options or {}
+    payload = mesh_data
+    if parent_filepath:
+        delta = make_delta_snapshot(mesh_data, parent_filepath, options)
+        if delta is None:
+            parent_filepath = ""
+        else:
+            payload = delta
+
+    if payload is mesh_data and options.get("quantize_bits"):
+        payload = quantize.quantize_mesh_data(
+            mesh_data, options["quantize_bits"], options.get("max_error", 0.0)
+        )
+    error_bound = payload.get("error_bound", 0.0)
+
+    file_size, raw_size = save_mesh_snapshot(payload, filepath, options)
+    # A lossy snapshot resolves to other positions than the capture; the
+    # cache must not hide that from restores and later deltas.
+    if options.get("cache") and not error_bound:
+        snapshot_cache.put(filepath, _without_layers(mesh_data))
+
+    return {
+        "file_size": file_size,
+        "raw_size": raw_size,
+        "parent_filepath": parent_filepath,
+        "error_bound": error_bound,
+    }
+
+
+def tag_redraw():
+    window_manager = bpy.context.window_manager
+    if window_manager is None:
+        return
+    for window in window_manager.windows:
+        for area in window.screen.areas:
+            if area.type == 'VIEW_3D':
+                area.tag_redraw()
 
 
 def load_mesh_from_json(filepath):
@@ -72,31 +768,304 @@ def load_mesh_from_json(filepath):
         raise FileNotFoundError(f"File not Found: {filepath}")
     
     with open(filepath, 'r', encoding='utf-8') as f:
-        return json.load(f)
+        return normalize_mesh_data(json.load(f))
 
 
-def apply_mesh_data(obj, mesh_data):
-    mesh = obj.data
-    
+def _expected_counts(mesh_data):
+    return (
+        mesh_data["vertex_count"],
+        mesh_data.get("edge_count", -1),
+        mesh_data.get("loop_count", -1),
+        mesh_data["face_count"],
+    )
+
+
+def _expected_topology(mesh_data):
+    expected_hash = mesh_data.get("topology_hash")
+    if expected_hash is None:
+        expected_hash = topology_hash(
+            mesh_data["edges"], mesh_data["loops"], mesh_data["loop_starts"]
+        )
+    return expected_hash
+
+
+def topology_matches(mesh, mesh_data, direct=False):
+    if _mesh_counts(mesh) != _expected_counts(mesh_data):
+        return False
+    return topology_hash(*_read_topology(mesh, direct)) == _expected_topology(mesh_data)
+
+
+def _rebuild_mesh(mesh, mesh_data):
+    positions = np.asarray(mesh_data["positions"], dtype=np.float32)
+    edges = np.asarray(mesh_data["edges"], dtype=np.int32)
+    loops = np.asarray(mesh_data["loops"], dtype=np.int32)
+    loop_starts = np.asarray(mesh_data["loop_starts"], dtype=np.int32)
+
     mesh.clear_geometry()
-    
-    bm = bmesh.new()
-    
-    for v_co in mesh_data["vertex"]:
-        bm.verts.new(v_co)
-    
-    bm.verts.ensure_lookup_table()
-    
-    for f_indices in mesh_data["faces"]:
-        try:
-            verts = [bm.verts[i] for i in f_indices]
-            bm.faces.new(verts)
-        except (ValueError, IndexError):
-            pass
-    
-    bm.to_mesh(mesh)
-    bm.free()
+
+    mesh.vertices.add(len(positions) // 3)
+    mesh.vertices.foreach_set("co", positions)
+
+    mesh.edges.add(len(edges) // 2)
+    mesh.edges.foreach_set("vertices", edges)
+
+    mesh.loops.add(len(loops))
+    mesh.loops.foreach_set("vertex_index", loops)
+
+    mesh.polygons.add(len(loop_starts))
+    mesh.polygons.foreach_set("loop_start", loop_starts)
+
+    # Recomputes corner edges for the faces while keeping the stored
+    # edges, so loose edges survive the rebuild.
+    mesh.update(calc_edges=True)
+    mesh.validate(clean_customdata=False)
+
+
+def _layers_to_restore(obj, mesh_data, filepath, positions_only):
+    if not filepath:
+        return {}
+    # After a rebuild every stored layer is needed; otherwise only those
+    # that differ from the mesh are decoded.
+    if positions_only:
+        keys = mesh_attributes.changed_layers(obj, mesh_data)
+    else:
+        keys = mesh_attributes.layer_keys(mesh_data)
+    return load_snapshot_layers(filepath, keys) if keys else {}
+
+
+def _apply_to_edit_mesh(obj, mesh_data, filepath=""):
+    mesh = obj.data
+    obj.update_from_editmode()
+    positions_only = topology_matches(mesh, mesh_data)
+    layers = _layers_to_restore(obj, mesh_data, filepath, positions_only)
+    bm = bmesh.from_edit_mesh(mesh)
+    positions = np.asarray(mesh_data["positions"], dtype=np.float32)
+
+    if positions_only and not any(key.startswith(mesh_attributes.ATTRIBUTE_PREFIX) for key in layers):
+        # BMesh has no bulk access, so the diff is taken on the synced
+        # mesh and only the vertices that moved are touched.
+        vectors = positions.reshape(-1, 3)
+        current = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+        mesh.vertices.foreach_get("co", current)
+        changed = np.flatnonzero(np.any(current.reshape(-1, 3) != vectors, axis=1))
+
+        if len(changed) > len(vectors) * EDIT_MESH_BULK_FRACTION:
+            # Past a few vertices it is faster to write the synced mesh in
+            # bulk and load it back into the BMesh than to assign in Python.
+            mesh.vertices.foreach_set("co", positions)
+            bm.clear()
+            bm.from_mesh(mesh)
+            destructive = True
+        else:
+            bm.verts.ensure_lookup_table()
+            verts = bm.verts
+            for index, co in zip(changed.tolist(), vectors[changed].tolist()):
+                verts[index].co = co
+            destructive = False
+        mesh_attributes.apply_vertex_groups_bmesh(obj, bm, mesh_data, layers)
+        bmesh.update_edit_mesh(mesh, loop_triangles=True, destructive=destructive)
+        return True
+
+    # Attribute layers go through a temporary mesh, which has bulk access,
+    # and are then loaded into the edit mesh in one go.
+    if positions_only:
+        temp = mesh.copy()
+        temp.vertices.foreach_set("co", positions)
+    else:
+        temp = bpy.data.meshes.new("mesh_history_restore")
+    try:
+        if not positions_only:
+            _rebuild_mesh(temp, mesh_data)
+        mesh_attributes.apply_attributes(temp, mesh_data, layers)
+        bm.clear()
+        bm.from_mesh(temp)
+    finally:
+        bpy.data.meshes.remove(temp)
+    mesh_attributes.apply_vertex_groups_bmesh(obj, bm, mesh_data, layers)
+    bmesh.update_edit_mesh(mesh, loop_triangles=True, destructive=True)
+    return positions_only
+
+
+def restore_layers(obj, mesh_data, filepath, positions_only):
+    layers = _layers_to_restore(obj, mesh_data, filepath, positions_only)
+    mesh_attributes.apply_attributes(obj.data, mesh_data, layers)
+    mesh_attributes.apply_vertex_groups(obj, mesh_data, layers)
+    return len(layers)
+
+
+def apply_mesh_data(obj, mesh_data, filepath=""):
+    # With filepath given, stored attribute layers and vertex groups are
+    # restored too.
+    leave_paint_modes(obj)
+    if obj.mode == 'EDIT':
+        return _apply_to_edit_mesh(obj, mesh_data, filepath)
+
+    mesh = obj.data
+
+    if topology_matches(mesh, mesh_data):
+        # Same connectivity: only move the vertices, which keeps UVs and
+        # every other layer on the mesh untouched.
+        mesh.vertices.foreach_set(
+            "co", np.asarray(mesh_data["positions"], dtype=np.float32)
+        )
+        restore_layers(obj, mesh_data, filepath, True)
+        mesh.update()
+        return True
+
+    _rebuild_mesh(mesh, mesh_data)
+    restore_layers(obj, mesh_data, filepath, False)
+    return False
+
+
+def vertex_mask(obj, mask, vertex_group="", bm=None):
+    # Indices of the masked vertices and, for a vertex group, their
+    # weights. In Edit Mode pass the edit BMesh, whose deform layer holds
+    # the current weights; otherwise expects obj.data to be in sync.
+    mesh = obj.data
+    if mask == 'SELECTED':
+        selected = np.empty(len(mesh.vertices), dtype=bool)
+        mesh.vertices.foreach_get("select", selected)
+        return np.flatnonzero(selected), None
+
+    group = obj.vertex_groups.get(vertex_group)
+    if group is None:
+        raise ValueError(f"Vertex group '{vertex_group}' not found")
+
+    group_index = group.index
+    if bm is not None:
+        layer = bm.verts.layers.deform.active
+        if layer is None:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        indices = []
+        weights = []
+        for vertex in bm.verts:
+            weight = vertex[layer].get(group_index, 0.0)
+            if weight > 0.0:
+                indices.append(vertex.index)
+                weights.append(weight)
+        return np.array(indices, dtype=np.int64), np.array(weights, dtype=np.float32)
+
+    vertices, groups, weights = mesh_attributes.vertex_group_arrays(obj)
+    member = (groups == group_index) & (weights > 0.0)
+    return vertices[member].astype(np.int64), weights[member]
+
+
+def apply_partial_mesh_data(obj, mesh_data, mask, vertex_group="", factor=1.0, direct=False):
+    leave_paint_modes(obj)
+    sync_edit_mesh(obj)
+    mesh = obj.data
+    # The live hash is cached per mesh, so repeated partial restores do
+    # not walk the whole topology again.
+    if (
+        _mesh_counts(mesh) != _expected_counts(mesh_data)
+        or _expected_topology(mesh_data) != live_topology_hash(mesh, direct)
+    ):
+        raise ValueError("Partial restore needs the snapshot topology to match the mesh")
+
+    bm = None
+    if obj.mode == 'EDIT':
+        bm = bmesh.from_edit_mesh(mesh)
+        bm.verts.ensure_lookup_table()
+    indices, weights = vertex_mask(obj, mask, vertex_group, bm)
+    if not len(indices):
+        return 0
+
+    blend = np.float32(factor) if weights is None else (weights * factor)[:, None]
+    target = np.asarray(mesh_data["positions"]).reshape(-1, 3)[indices].astype(np.float32)
+
+    if bm is not None:
+        verts = bm.verts
+        current = np.array([verts[i].co for i in indices.tolist()], dtype=np.float32)
+        target = current + (target - current) * blend
+        for index, co in zip(indices.tolist(), target.tolist()):
+            verts[index].co = co
+        bmesh.update_edit_mesh(mesh, loop_triangles=True, destructive=False)
+        mark_moved(mesh)
+        return len(indices)
+
+    # Through a view of the mesh only the masked rows are touched; the
+    # fallback costs one bulk read and write of the positions.
+    positions, is_view = mesh_buffers.write_target(mesh, "positions", direct)
+    if not is_view:
+        mesh.vertices.foreach_get("co", positions)
+    vectors = positions.reshape(-1, 3)
+    current = vectors[indices]
+    vectors[indices] = current + (target - current) * blend
+    mesh_buffers.commit(mesh, "positions", positions, is_view)
     mesh.update()
+    mark_moved(mesh)
+    return len(indices)
+
+
+def _open_snapshot_chain(filepath):
+    chain = [snapshot_format.read_snapshot(filepath)]
+    visited = {os.path.abspath(filepath)}
+    try:
+        while "parent" in chain[-1].metadata:
+            filepath = _parent_path(filepath, chain[-1].metadata)
+            if os.path.abspath(filepath) in visited:
+                raise ValueError(f"Snapshot delta chain loops back to {filepath}")
+            visited.add(os.path.abspath(filepath))
+            if not pack_store.exists(filepath):
+                raise FileNotFoundError(f"File not Found: {filepath}")
+            chain.append(snapshot_format.read_snapshot(filepath))
+    except Exception:
+        for snapshot in chain:
+            snapshot.close()
+        raise
+    return chain
+
+
+def stream_mesh_snapshot(obj, filepath, prefs):
+    # Restores a snapshot too large to hold in memory twice: every array
+    # is decoded straight into the mesh, or into one array the size of the
+    # mesh attribute, chunk_size bytes at a time.
+    if not pack_store.exists(filepath):
+        raise FileNotFoundError(f"File not Found: {filepath}")
+    leave_paint_modes(obj)
+    # The edit mesh can only be written vertex by vertex through BMesh,
+    # so there is nothing to stream into.
+    if obj.mode == 'EDIT' or not snapshot_format.is_snapshot_file(filepath):
+        return apply_mesh_data(obj, load_mesh_snapshot(filepath), filepath)
+
+    mesh = obj.data
+    direct = prefs.direct_mesh_access
+    chunk_size = prefs.stream_chunk_mb * MEGABYTE
+    chain = _open_snapshot_chain(filepath)
+    try:
+        keyframe = chain[-1]
+        positions_only = topology_matches(mesh, keyframe, direct)
+        if not positions_only:
+            mesh.clear_geometry()
+            mesh.vertices.add(keyframe.blocks["positions"]["count"] // 3)
+            mesh.edges.add(keyframe.blocks["edges"]["count"] // 2)
+            mesh.loops.add(keyframe.blocks["loops"]["count"])
+            mesh.polygons.add(keyframe.blocks["loop_starts"]["count"])
+            for key in ("edges", "loops", "loop_starts"):
+                target, is_view = mesh_buffers.write_target(mesh, key, direct)
+                keyframe.read_into(key, target, chunk_size)
+                mesh_buffers.commit(mesh, key, target, is_view)
+                del target
+
+        positions, is_view = mesh_buffers.write_target(mesh, "positions", direct)
+        keyframe.read_into("positions", positions, chunk_size)
+        vectors = positions.reshape(-1, 3)
+        for delta in reversed(chain[:-1]):
+            vectors[delta["delta_indices"]] += delta["delta_positions"].reshape(-1, 3)
+        mesh_buffers.commit(mesh, "positions", positions, is_view)
+        del vectors, positions
+        metadata = chain[0].metadata
+    finally:
+        for snapshot in chain:
+            snapshot.close()
+
+    if positions_only:
+        mesh.update()
+    else:
+        mesh.update(calc_edges=True)
+        mesh.validate(clean_customdata=False)
+    restore_layers(obj, metadata, filepath, positions_only)
+    return positions_only
 
 
 def sanitize_filename(filename):
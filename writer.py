@@ -0,0 +1,179 @@
+import bpy
+import queue
+import threading
+from bpy.app.handlers import persistent
+from concurrent.futures import ThreadPoolExecutor
+
+from . import compression
+from . import pack_store
+
+
+POLL_INTERVAL = 0.25
+
+_executor = None
+_slots = None
+_pending = {}
+_pending_lock = threading.Lock()
+_results = queue.SimpleQueue()
+
+
+def _ensure_executor():
+    global _executor, _slots
+
+    if _executor is None:
+        from .addon_preferences import get_preferences
+        prefs = get_preferences()
+        _executor = ThreadPoolExecutor(
+            max_workers=prefs.writer_threads,
+            thread_name_prefix="mesh_history_writer"
+        )
+        _slots = threading.BoundedSemaphore(prefs.max_pending_writes)
+    return _executor
+
+
+def _run(filepath, depends_on, job, args):
+    try:
+        if depends_on:
+            try:
+                wait(depends_on)
+            except Exception:
+                # The job falls back to a full write when its parent
+                # never made it to disk.
+                pass
+        _results.put((filepath, job(*args), None))
+    except Exception as e:
+        _results.put((filepath, None, e))
+    finally:
+        _slots.release()
+
+
+def submit(filepath, job, *args, depends_on=""):
+    executor = _ensure_executor()
+
+    # Blocks the caller once max_pending_writes jobs are queued, so a
+    # burst of saves cannot pile up unbounded copies of mesh data.
+    _slots.acquire()
+
+    with _pending_lock:
+        _pending[filepath] = executor.submit(_run, filepath, depends_on, job, args)
+
+    if not bpy.app.timers.is_registered(_poll):
+        bpy.app.timers.register(_poll, first_interval=POLL_INTERVAL)
+
+
+def run_parallel(function, items):
+    return list(_ensure_executor().map(function, items))
+
+
+def run_async(function, *args):
+    return _ensure_executor().submit(function, *args)
+
+
+def pending_paths():
+    with _pending_lock:
+        return set(_pending)
+
+
+def is_pending(filepath):
+    with _pending_lock:
+        future = _pending.get(filepath)
+    return future is not None and not future.done()
+
+
+def wait(filepath):
+    with _pending_lock:
+        future = _pending.get(filepath)
+    if future is not None:
+        future.result()
+
+
+def _apply_results():
+    results = {}
+    while True:
+        try:
+            filepath, result, error = _results.get_nowait()
+        except queue.Empty:
+            break
+        results[filepath] = (result, error)
+        with _pending_lock:
+            _pending.pop(filepath, None)
+
+    if not results:
+        return
+
+    from . import utils
+
+    for scene in bpy.data.scenes:
+        snapshots = scene.mesh_snapshots
+        changed = False
+        for snapshot in snapshots:
+            entry = results.get(snapshot.filepath)
+            if entry is None:
+                continue
+
+            result, error = entry
+            if error is not None:
+                snapshot.write_state = 'FAILED'
+                print(f"Mesh History: Failed to write '{snapshot.filepath}': {error}")
+                continue
+
+            snapshot.write_state = 'WRITTEN'
+            snapshot.file_size = result["file_size"]
+            snapshot.raw_size = result["raw_size"]
+            snapshot.is_lossy = result["error_bound"] > 0.0
+            snapshot.error_bound = result["error_bound"]
+            if snapshot.parent_filepath != result["parent_filepath"]:
+                snapshot.parent_filepath = result["parent_filepath"]
+                changed = True
+
+        if changed:
+            utils.update_chain_depths(snapshots)
+
+    utils.tag_redraw()
+
+
+def _poll():
+    _apply_results()
+    with _pending_lock:
+        busy = bool(_pending)
+    if busy:
+        return POLL_INTERVAL
+    pack_store.save_indices()
+    return None
+
+
+def flush():
+    with _pending_lock:
+        futures = list(_pending.values())
+    for future in futures:
+        future.exception()
+    _apply_results()
+    pack_store.save_indices()
+
+
+def shutdown():
+    global _executor, _slots
+
+    flush()
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+        _slots = None
+
+
+@persistent
+def _flush_before_save(*args):
+    flush()
+
+
+def register():
+    bpy.app.handlers.save_pre.append(_flush_before_save)
+
+
+def unregister():
+    if _flush_before_save in bpy.app.handlers.save_pre:
+        bpy.app.handlers.save_pre.remove(_flush_before_save)
+    if bpy.app.timers.is_registered(_poll):
+        bpy.app.timers.unregister(_poll)
+    shutdown()
+    compression.shutdown()